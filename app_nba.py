@@ -3,14 +3,32 @@
 # ITOM6265 - Database Project
 # ============================================
 
+import asyncio
+import copy
+import heapq
 import inspect
 import json
+import operator
+import os
+import random
 import re
-from collections import Counter
+import shutil
+import sys
+import tempfile
+import threading
+from bisect import bisect_left, insort
+from itertools import chain, islice
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 
 st.set_page_config(
@@ -54,8 +72,264 @@ NBA_COLORS = {
     'WAS': {'primary': '#002B5C', 'secondary': '#E31837'}
 }
 
-SALARY_CAP = 136_000_000
-LUXURY_TAX_THRESHOLD = 165_000_000
+# Cap rules per season. The luxury tax is charged per ``tax_bracket`` dollars over the tax line at
+# the listed rates, each bracket past the table adding ``tax_rate_step`` to the last rate; repeat
+# taxpayers pay the repeater rates. Over-the-cap trades must match salary: for outgoing salary up to
+# each band's limit a team may take back ``ratio * outgoing + cushion``. Teams above the first apron
+# may take back at most ``first_apron_matching`` × outgoing and teams above the second apron may not
+# aggregate salaries.
+CAP_RULES = {
+    '2023-24': {
+        'salary_cap': 136_021_000,
+        'tax_line': 165_294_000,
+        'first_apron': 172_346_000,
+        'second_apron': 182_794_000,
+        'tax_bracket': 5_000_000,
+        'tax_rates': (1.5, 1.75, 2.5, 3.25),
+        'repeater_rates': (2.5, 2.75, 3.5, 4.25),
+        'tax_rate_step': 0.5,
+        'matching_bands': ((7_500_000, 2.0, 250_000), (29_000_000, 1.0, 7_500_000), (float('inf'), 1.25, 250_000)),
+        'first_apron_matching': 1.1,
+        'repeater_teams': (),
+    },
+    '2024-25': {
+        'salary_cap': 140_588_000,
+        'tax_line': 170_814_000,
+        'first_apron': 178_132_000,
+        'second_apron': 188_931_000,
+        'tax_bracket': 5_000_000,
+        'tax_rates': (1.5, 1.75, 2.5, 3.25),
+        'repeater_rates': (2.5, 2.75, 3.5, 4.25),
+        'tax_rate_step': 0.5,
+        'matching_bands': ((7_500_000, 2.0, 250_000), (29_000_000, 1.0, 7_500_000), (float('inf'), 1.25, 250_000)),
+        'first_apron_matching': 1.0,
+        'repeater_teams': (),
+    },
+}
+DEFAULT_CAP_SEASON = '2024-25'
+CAP_STATUS_LABELS = ("Above Second Apron", "Above First Apron", "Luxury Tax", "Over Cap", "Under Cap")
+
+# Contract terms are not in the source data; rows without them are treated as having this
+# many seasons left (including the current one) with a flat annual raise.
+DEFAULT_CONTRACT_YEARS = 3
+DEFAULT_ANNUAL_RAISE = 0.05
+PROJECTION_SEASONS = 5
+DEFAULT_CAP_GROWTH = 0.07
+
+# Signing optimizer: asking salaries are rounded up to this many dollars so the knapsack table
+# stays small, and every player outside the selected team is treated as available.
+OPTIMIZER_SALARY_STEP = 250_000
+OPTIMIZER_OBJECTIVES = {
+    'Contract Efficiency (CES)': 'contract_efficiency_score',
+    'Production (PTS + REB + AST)': 'production',
+}
+OPTIMIZER_BUDGET_LINES = {
+    'Salary Cap': 'salary_cap',
+    'Luxury Tax': 'tax_line',
+    'First Apron': 'first_apron',
+    'Second Apron': 'second_apron',
+}
+OPTIMIZER_ASKING_COLUMNS = {
+    'Current salary': 'salary_usd',
+    'Predicted salary': 'predicted_salary',
+}
+
+# Scatter level-of-detail: SVG up to the WebGL threshold, WebGL up to the density threshold,
+# then a binned density heatmap with only the sparsest (outlier) players drawn as points.
+SCATTER_WEBGL_THRESHOLD = 1_000
+SCATTER_DENSITY_THRESHOLD = 5_000
+SCATTER_DENSITY_BINS = 60
+SCATTER_OUTLIER_BIN_COUNT = 3
+SCATTER_MAX_OUTLIERS = 1_500
+
+DERIVED_CACHE_MAX_ENTRIES = 256
+DERIVED_CACHE_MAX_BYTES = 128 * 1024 * 1024
+SOURCE_DATASET = 'Full_NBA_Dataset.xlsx'
+PREPARED_DATASET_ENV = 'NBA_PREPARED_DATASET'
+WARMUP_MAX_WORKERS = 4
+CONTRACT_COALESCE_SECONDS = 0.25
+CONTRACT_STATUS_POLL_SECONDS = 0.5
+
+LEADERBOARD_METRICS = ['pts', 'reb', 'assists', 'salary_usd', 'contract_efficiency_score']
+CES_BASIS_COLUMNS = ['pts', 'reb', 'assists']
+CES_WEIGHTS = {'pts': 0.6, 'reb': 0.25, 'assists': 0.15}
+# CES quantiles at which contracts move from Overpaid to Fair and from Fair to Underpaid.
+VALUE_TIER_QUANTILES = (0.4, 0.75)
+SALARY_MODEL_FEATURES = ['pts', 'reb', 'assists', 'gp']
+# Ridge penalty on standardized features, so one value shrinks every stat alike whatever its scale.
+SALARY_MODEL_ALPHA = 10.0
+COMPS_FEATURES = ['norm_pts', 'norm_reb', 'norm_assists']
+COMPS_EXTRA_FEATURES = {'gp': 'Games Played', 'salary_usd': 'Salary'}
+COMPS_LEAF_SIZE = 16
+COMPS_REBUILD_FRACTION = 0.1
+
+VALUE_LABELS = ['Overpaid', 'Fair', 'Underpaid']
+
+# Compact column types applied at load. Salaries and dollar ratios stay float64 because
+# contract amounts exceed the range float32 represents exactly.
+CONTRACT_SCHEMA = {
+    'player_id': 'int32',
+    'player_name': 'category',
+    'team_key': 'category',
+    'team_name': 'category',
+    'season': 'category',
+    'salary_usd': 'float64',
+    'gp': 'int16',
+    'pts': 'float32',
+    'reb': 'float32',
+    'assists': 'float32',
+    'dollars_per_point': 'float64',
+    'dollars_per_game': 'float64',
+    'contract_years': 'int8',
+    'annual_raise': 'float32',
+    'contract_value_label': 'category',
+}
+
+LEADERBOARD_PAGE_SIZES = [25, 50, 100]
+CES_LEADERBOARD_COLUMNS = {
+    'contract_efficiency_score': 'CES',
+    'player_name': 'Player',
+    'team_name': 'Team',
+    'contract_value_label': 'Value Label',
+    'salary_usd': 'Salary (USD)',
+    'predicted_salary': 'Predicted Salary (USD)',
+    'pts': 'PTS',
+    'reb': 'REB',
+    'assists': 'AST',
+}
+
+# Natural-language query planner vocabulary. Phrases map to columns; the patterns are compiled
+# once at import and every parsed question's plan is cached by its normalized text.
+QUERY_METRIC_SYNONYMS = {
+    'dollars per point': 'dollars_per_point',
+    'cost per point': 'dollars_per_point',
+    'dollars per game': 'dollars_per_game',
+    'cost per game': 'dollars_per_game',
+    'predicted salary': 'predicted_salary',
+    'contract years': 'contract_years',
+    'years left': 'contract_years',
+    'games played': 'gp',
+    'games': 'gp',
+    'gp': 'gp',
+    'points': 'pts',
+    'point': 'pts',
+    'pts': 'pts',
+    'ppg': 'pts',
+    'scorers': 'pts',
+    'scorer': 'pts',
+    'scoring': 'pts',
+    'rebounds': 'reb',
+    'rebound': 'reb',
+    'rebounders': 'reb',
+    'rebounder': 'reb',
+    'reb': 'reb',
+    'assists': 'assists',
+    'assist': 'assists',
+    'ast': 'assists',
+    'passers': 'assists',
+    'playmakers': 'assists',
+    'salaries': 'salary_usd',
+    'salary': 'salary_usd',
+    'paid': 'salary_usd',
+    'payroll': 'salary_usd',
+    'cheapest': 'salary_usd',
+    'expensive': 'salary_usd',
+    'efficient': 'contract_efficiency_score',
+    'efficiency': 'contract_efficiency_score',
+    'ces': 'contract_efficiency_score',
+}
+QUERY_COLUMN_ALIASES = {'salary_usd': 'salary', 'pts': 'points', 'contract_efficiency_score': 'ces'}
+QUERY_AGGREGATES = {
+    'average': 'mean', 'avg': 'mean', 'mean': 'mean', 'median': 'median',
+    'total': 'sum', 'sum': 'sum', 'combined': 'sum',
+    'how many': 'count', 'count': 'count', 'number of': 'count',
+}
+QUERY_AGGREGATE_PREFIXES = {'mean': 'avg', 'median': 'median', 'sum': 'total', 'count': 'count'}
+QUERY_COMPARATORS = {
+    'more than': '>', 'greater than': '>', 'over': '>', 'above': '>', '>': '>',
+    'at least': '>=', '>=': '>=',
+    'less than': '<', 'fewer than': '<', 'under': '<', 'below': '<', '<': '<',
+    'at most': '<=', '<=': '<=',
+}
+QUERY_OPERATORS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+    '==': operator.eq, 'in': pd.Series.isin,
+}
+QUERY_NUMBER_UNITS = {'k': 1_000, 'thousand': 1_000, 'm': 1_000_000, 'million': 1_000_000}
+QUERY_DEFAULT_LIMIT = 5
+# Team codes recognized in questions; the dataset abbreviates Brooklyn as BKN.
+QUERY_TEAM_CODES = frozenset(NBA_COLORS) | {'BKN'}
+# City and nickname per team; "Los Angeles" alone is ambiguous, so only the nicknames resolve it.
+QUERY_TEAMS = {
+    'ATL': ('atlanta', 'hawks'), 'BOS': ('boston', 'celtics'), 'BKN': ('brooklyn', 'nets'),
+    'CHA': ('charlotte', 'hornets'), 'CHI': ('chicago', 'bulls'), 'CLE': ('cleveland', 'cavaliers'),
+    'DAL': ('dallas', 'mavericks'), 'DEN': ('denver', 'nuggets'), 'DET': ('detroit', 'pistons'),
+    'GSW': ('golden state', 'warriors'), 'HOU': ('houston', 'rockets'), 'IND': ('indiana', 'pacers'),
+    'LAC': ('los angeles', 'clippers'), 'LAL': ('los angeles', 'lakers'), 'MEM': ('memphis', 'grizzlies'),
+    'MIA': ('miami', 'heat'), 'MIL': ('milwaukee', 'bucks'), 'MIN': ('minnesota', 'timberwolves'),
+    'NOP': ('new orleans', 'pelicans'), 'NYK': ('new york', 'knicks'), 'OKC': ('oklahoma city', 'thunder'),
+    'ORL': ('orlando', 'magic'), 'PHI': ('philadelphia', '76ers'), 'PHX': ('phoenix', 'suns'),
+    'POR': ('portland', 'trail blazers'), 'SAC': ('sacramento', 'kings'), 'SAS': ('san antonio', 'spurs'),
+    'TOR': ('toronto', 'raptors'), 'UTA': ('utah', 'jazz'), 'WAS': ('washington', 'wizards'),
+}
+QUERY_TEAM_ALIASES = {
+    'cavs': 'CLE', 'mavs': 'DAL', 'dubs': 'GSW', 'la clippers': 'LAC', 'la lakers': 'LAL', 'grizz': 'MEM',
+    'wolves': 'MIN', 'pels': 'NOP', 'sixers': 'PHI', 'blazers': 'POR',
+}
+# Nicknames that are also everyday words ("20 million bucks") count only after "the" or a preposition.
+QUERY_TEAM_COMMON_WORDS = {'bucks', 'heat', 'jazz', 'kings', 'magic', 'nets', 'suns', 'thunder'}
+QUERY_TEAM_NAMES = {
+    **{f"{city} {nickname}": code for code, (city, nickname) in QUERY_TEAMS.items()},
+    **{city: code for code, (city, _) in QUERY_TEAMS.items() if city != 'los angeles'},
+    **{nickname: code for code, (_, nickname) in QUERY_TEAMS.items() if nickname not in QUERY_TEAM_COMMON_WORDS},
+    **QUERY_TEAM_ALIASES,
+}
+QUERY_TEAM_CONTEXT_NAMES = {nickname: code for code, (_, nickname) in QUERY_TEAMS.items() if nickname in QUERY_TEAM_COMMON_WORDS}
+
+
+def _phrase_pattern(phrases):
+    return '|'.join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+
+
+QUERY_METRIC_PATTERN = re.compile(rf"\b({_phrase_pattern(QUERY_METRIC_SYNONYMS)})\b")
+QUERY_AGGREGATE_PATTERN = re.compile(rf"\b({_phrase_pattern(QUERY_AGGREGATES)})\b")
+_QUERY_COMPARATOR = rf"(?P<op>{_phrase_pattern(QUERY_COMPARATORS)})"
+_QUERY_NUMBER = r"\$?(?P<number>\d[\d,]*(?:\.\d+)?)\s*(?P<unit>k|m|million|thousand)?\b"
+_QUERY_METRIC = rf"(?P<metric>{_phrase_pattern(QUERY_METRIC_SYNONYMS)})"
+QUERY_FILTER_PATTERNS = [
+    re.compile(rf"\b{_QUERY_METRIC}\s+(?:of\s+|is\s+|are\s+)?{_QUERY_COMPARATOR}\s*{_QUERY_NUMBER}"),
+    re.compile(rf"(?<![\w<>=]){_QUERY_COMPARATOR}\s*{_QUERY_NUMBER}\s+(?:in\s+)?{_QUERY_METRIC}\b"),
+    # A bare dollar amount ("paid over $30M") filters on salary.
+    re.compile(rf"(?<![\w<>=]){_QUERY_COMPARATOR}\s*(?=\$){_QUERY_NUMBER}"),
+]
+_QUERY_RANGE = (
+    r"between\s+\$?(?P<low>\d[\d,]*(?:\.\d+)?)\s*(?P<low_unit>k|m|million|thousand)?"
+    r"\s+and\s+\$?(?P<high>\d[\d,]*(?:\.\d+)?)\s*(?P<high_unit>k|m|million|thousand)?\b"
+)
+QUERY_RANGE_PATTERNS = [
+    re.compile(rf"\b{_QUERY_METRIC}\s+(?:of\s+|is\s+|are\s+)?{_QUERY_RANGE}"),
+    re.compile(rf"\b{_QUERY_RANGE}\s+(?:in\s+)?{_QUERY_METRIC}\b"),
+    # A bare dollar range ("paid between $10M and $20M") filters on salary.
+    re.compile(rf"\b(?=between\s+\$){_QUERY_RANGE}"),
+]
+_QUERY_TEAM_PREFIX = r"(?:(?:on|for|from|at|with|of|in) )"
+QUERY_TEAM_PATTERNS = [
+    (re.compile(rf"\b{_QUERY_TEAM_PREFIX}?(?:the )?(?P<team>{_phrase_pattern(QUERY_TEAM_NAMES)})\b"), QUERY_TEAM_NAMES),
+    (re.compile(rf"\b(?:{_QUERY_TEAM_PREFIX}(?:the )?|the )(?P<team>{_phrase_pattern(QUERY_TEAM_CONTEXT_NAMES)})\b"), QUERY_TEAM_CONTEXT_NAMES),
+    (re.compile(rf"\b{_QUERY_TEAM_PREFIX}?(?:the )?(?P<team>{_phrase_pattern(QUERY_TEAM_CODES)})\b"), {code: code for code in QUERY_TEAM_CODES}),
+]
+# Phrases that promise a filter; left over after parsing, they mean a team or range was not understood.
+QUERY_UNPARSED_TEAM_PATTERN = re.compile(r"\bon the \w+|\bplay(?:s|ing)? for\b")
+QUERY_UNPARSED_RANGE_PATTERN = re.compile(r"\bbetween\b")
+QUERY_LIMIT_PATTERN = re.compile(r"\b(?:top|bottom|first|last)\s+(\d+)\b|\b(\d+)\s+(?:players|teams)\b")
+QUERY_GROUP_PATTERN = re.compile(
+    r"\bteams\b|\b(?:by|per|each|every|which|what) team\b|\bteam (?:with|has|had|that)\b"
+)
+# "who is the", "who scored the": a single answer; "players who are overpaid" is not.
+QUERY_SINGULAR_PATTERN = re.compile(r"\b(?:which|what) (?:team|player)\b|\bwho (?!are\b|were\b|have\b)\w+ the\b")
+QUERY_DESCENDING_PATTERN = re.compile(r"\b(?:top|highest|most|best|leading|largest|biggest|max(?:imum)?)\b")
+QUERY_ASCENDING_PATTERN = re.compile(r"\b(?:bottom|lowest|least|fewest|worst|smallest|cheapest|min(?:imum)?)\b")
+QUERY_LABEL_PATTERN = re.compile(r"\b(underpaid|overpaid|fair)\b")
 
 PLAYER_IMAGES = {
     'Gilgeous-Alexander Shai': 'https://cdn.nba.com/headshots/nba/latest/1040x760/1628983.png',
@@ -72,6 +346,34 @@ PLAYER_IMAGES = {
 
 PLAYER_ID_MAP = {}
 
+# Exports are written in chunks of rows and collected in a temp file that only rolls over to
+# disk past the spool size, so large downloads never build one big formatted string.
+EXPORT_CHUNK_ROWS = 10_000
+EXPORT_SPOOL_MEMORY = 8 * 1024 * 1024
+
+# Headless JSON API (`python app_nba.py --serve-api 8765`). Handlers run on a thread pool and
+# their responses are cached per endpoint, payload and data version.
+API_DEFAULT_HOST = '127.0.0.1'
+API_DEFAULT_PORT = 8765
+API_WORKERS = 4
+API_MAX_BATCH = 1_000
+API_MAX_BODY_BYTES = 4 * 1024 * 1024
+
+# Chat history bounds: older messages are dropped past the message cap, results are kept as
+# Arrow IPC bytes and spilled to a temp file, oldest first, once a session's in-memory results pass the
+# byte budget; only the latest messages render their results eagerly.
+CHAT_HISTORY_MAX_MESSAGES = 100
+CHAT_RESULT_MEMORY_BUDGET = 2 * 1024 * 1024
+CHAT_EAGER_MESSAGES = 6
+CHAT_SPILL_DIR = os.path.join(tempfile.gettempdir(), 'nba_chat_results')
+
+# Session-state entries that hold data frames or result sets and can be evicted from idle
+# sessions. Saved trade proposals are user data with no rebuild path, so they are never offered.
+HEAVY_SESSION_KEYS = [
+    'contract_store',
+    'chat_history',
+]
+
 
 def _tokenize(text):
     return re.findall(r"\b\w+\b", text.lower())
@@ -100,6 +402,7 @@ def cosine_similarity(vec_a, vec_b):
 def build_rag_documents(contract_df):
     column_list = ", ".join(sorted(contract_df.columns))
     sample_rows = contract_df.head(3).to_dict(orient="records")
+    cap_rules = cap_rules_for(contract_df)
 
     documents = [
         {
@@ -115,8 +418,9 @@ def build_rag_documents(contract_df):
             "id": "salary_rules",
             "title": "Salary Cap & Luxury Tax Rules",
             "text": (
-                "Salary cap is set to $136,000,000 and the luxury tax threshold is $165,000,000. "
-                "Trades and team evaluations compare post-trade salary against these thresholds."
+                f"Salary cap is set to ${cap_rules['salary_cap']:,} and the luxury tax threshold is ${cap_rules['tax_line']:,}, "
+                f"with the first apron at ${cap_rules['first_apron']:,} and the second apron at ${cap_rules['second_apron']:,}. "
+                "Teams over the tax pay a tiered luxury tax bill, and trades must match salaries, with tighter limits above each apron."
             ),
         },
         {
@@ -151,6 +455,14 @@ def build_vector_index(documents):
     return indexed
 
 
+def get_base_rag_index(df):
+    """Documents and vector index for the loaded dataset, built once per data version for all sessions."""
+    def build():
+        documents = build_rag_documents(df)
+        return documents, build_vector_index(documents)
+    return get_cached_artifact(('rag_index', df.attrs.get('data_version')), build)
+
+
 def retrieve_documents(query, vector_index, top_k=3):
     query_vec = vectorize_text(query)
     scored = []
@@ -200,6 +512,322 @@ def supports_plotly_click():
     except Exception:
         return False
 
+
+def run_as_fragment(func):
+    """Wrap ``func`` so its widgets rerun only their own region, falling back to a plain call."""
+    if hasattr(st, 'fragment'):
+        return st.fragment(func)
+    return func
+
+
+def build_lod_scatter(plot_df, x, y, x_range=None, y_range=None, **scatter_kwargs):
+    """Build a scatter whose payload stays bounded as the frame grows.
+
+    Returns the figure and the render mode ("svg", "webgl", or "density"). In density
+    mode dense regions become a binned heatmap and only players in sparse bins are sent
+    as clickable points; narrowing ``x_range``/``y_range`` drills back down to raw points.
+    """
+    view_df = plot_df
+    if x_range is not None:
+        view_df = view_df[view_df[x].between(*x_range)]
+    if y_range is not None:
+        view_df = view_df[view_df[y].between(*y_range)]
+
+    if len(view_df) <= SCATTER_WEBGL_THRESHOLD:
+        return px.scatter(view_df, x=x, y=y, **scatter_kwargs), "svg"
+    if len(view_df) <= SCATTER_DENSITY_THRESHOLD:
+        return px.scatter(view_df, x=x, y=y, render_mode='webgl', **scatter_kwargs), "webgl"
+
+    x_values = view_df[x].to_numpy(dtype=float)
+    y_values = view_df[y].to_numpy(dtype=float)
+    finite = np.isfinite(x_values) & np.isfinite(y_values)
+    counts, x_edges, y_edges = np.histogram2d(x_values[finite], y_values[finite], bins=SCATTER_DENSITY_BINS)
+
+    x_bins = np.clip(np.searchsorted(x_edges, x_values[finite], side='right') - 1, 0, SCATTER_DENSITY_BINS - 1)
+    y_bins = np.clip(np.searchsorted(y_edges, y_values[finite], side='right') - 1, 0, SCATTER_DENSITY_BINS - 1)
+    point_bin_counts = counts[x_bins, y_bins]
+
+    sparse_positions = np.flatnonzero(finite)[point_bin_counts <= SCATTER_OUTLIER_BIN_COUNT]
+    sparse_counts = point_bin_counts[point_bin_counts <= SCATTER_OUTLIER_BIN_COUNT]
+    outlier_positions = sparse_positions[np.argsort(sparse_counts, kind='stable')[:SCATTER_MAX_OUTLIERS]]
+    outlier_df = view_df.iloc[np.sort(outlier_positions)]
+
+    fig = px.scatter(outlier_df, x=x, y=y, render_mode='webgl', **scatter_kwargs)
+    density = go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=np.where(counts.T > 0, counts.T, np.nan),
+        colorscale='Blues',
+        showscale=False,
+        hovertemplate='Players in bin: %{z:.0f}<extra></extra>',
+        name='Density',
+    )
+    fig.add_trace(density)
+    fig.data = (fig.data[-1],) + fig.data[:-1]
+    return fig, "density"
+
+
+def describe_scatter_mode(mode, total_points):
+    if mode == "density":
+        return (
+            f"Showing {total_points:,} players as a density map with outliers as points. "
+            "Narrow the zoom window to drill down to individual players."
+        )
+    if mode == "webgl":
+        return f"Rendering {total_points:,} players with WebGL for smooth interaction."
+    return None
+
+
+def scatter_zoom_window(plot_df, x, y, x_label, y_label, key):
+    """Range sliders for drilling into a density-mode scatter; ``(None, None)`` while the frame is small.
+
+    A stored window outside the current frame's bounds (after a filter change) resets to the full range.
+    """
+    if len(plot_df) <= SCATTER_DENSITY_THRESHOLD:
+        return None, None
+    ranges = []
+    with st.expander("🔍 Zoom window (drill down into dense regions)"):
+        for column, label, suffix in ((x, x_label, 'x'), (y, y_label, 'y')):
+            values = plot_df[column].to_numpy(dtype=float)
+            values = values[np.isfinite(values)]
+            if len(values) == 0 or values.min() == values.max():
+                ranges.append(None)
+                continue
+            low, high = float(values.min()), float(values.max())
+            widget_key = f"{key}_{suffix}"
+            stored = st.session_state.get(widget_key)
+            if stored is not None and not (low <= stored[0] <= stored[1] <= high):
+                del st.session_state[widget_key]
+            ranges.append(st.slider(f"{label} range", low, high, (low, high), key=widget_key))
+    return tuple(ranges)
+
+
+def deep_sizeof(obj, seen=None):
+    """Estimate the deep memory footprint of an object in bytes, counting shared objects once."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def format_bytes(num_bytes):
+    """Render a byte count with a human-readable unit."""
+    for unit in ['B', 'KB', 'MB']:
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:,.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:,.1f} GB"
+
+
+@st.cache_resource
+def get_session_registry():
+    """Process-wide registry of session states so memory can be accounted across open tabs."""
+    return {}
+
+
+def get_script_context():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx()
+    except Exception:
+        return None
+
+
+def get_current_session_id():
+    ctx = get_script_context()
+    return ctx.session_id if ctx is not None else "local"
+
+
+def register_session():
+    """Record this session's state object and last activity time in the process registry.
+
+    Closed sessions are pruned on every registration, so their state and spilled chat results
+    are released without anyone visiting the Memory Usage page.
+    """
+    ctx = get_script_context()
+    if ctx is None:
+        return
+
+    registry = get_session_registry()
+    prune_closed_sessions(registry)
+    registry[ctx.session_id] = {
+        'state': ctx.session_state,
+        'last_seen': time.time(),
+    }
+
+
+def prune_closed_sessions(registry):
+    """Drop registry entries and spilled chat results for sessions the Streamlit runtime no longer tracks."""
+    try:
+        from streamlit.runtime import Runtime
+        if not Runtime.exists():
+            return
+        runtime = Runtime.instance()
+        for session_id in list(registry):
+            if not runtime.is_active_session(session_id):
+                registry.pop(session_id, None)
+                remove_chat_spill_dir(session_id)
+    except Exception:
+        pass
+
+
+def collect_session_memory(registry):
+    """Return per-entry deep sizes for every registered session."""
+    rows = []
+    now = time.time()
+    for session_id, entry in list(registry.items()):
+        try:
+            state_items = entry['state'].filtered_state
+        except Exception:
+            continue
+        for key, value in state_items.items():
+            rows.append({
+                'session_id': session_id,
+                'key': key,
+                'type': type(value).__name__,
+                'bytes': deep_sizeof(value),
+                'idle_seconds': now - entry['last_seen'],
+            })
+    return pd.DataFrame(rows, columns=['session_id', 'key', 'type', 'bytes', 'idle_seconds'])
+
+
+def evict_idle_sessions(registry, idle_seconds, keys, current_session_id=None):
+    """Remove heavy entries from sessions idle longer than ``idle_seconds``; returns evicted count."""
+    evicted = 0
+    now = time.time()
+    for session_id, entry in list(registry.items()):
+        if session_id == current_session_id or now - entry['last_seen'] < idle_seconds:
+            continue
+        state = entry['state']
+        for key in keys:
+            try:
+                if key == 'chat_history' and key in state:
+                    # Keep the conversation text; only the stored result tables are dropped.
+                    for msg in state[key]:
+                        if drop_chat_result(msg):
+                            evicted += 1
+                elif key in state:
+                    del state[key]
+                    evicted += 1
+            except Exception:
+                continue
+    return evicted
+
+
+def pack_chat_result(result_df):
+    """Serialize a result frame to Arrow IPC bytes (columnar, categories dictionary-encoded)."""
+    import pyarrow as pa
+
+    # Results inherit the dataset's category lists; keep only the values actually present.
+    result_df = result_df.assign(**{
+        col: result_df[col].cat.remove_unused_categories()
+        for col in result_df.columns
+        if isinstance(result_df[col].dtype, pd.CategoricalDtype)
+    })
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(result_df, preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def load_chat_result(msg):
+    """Result frame of an assistant message, read from memory or its spill file; ``None`` if dropped."""
+    import pyarrow as pa
+
+    if msg.get('result') is not None:
+        source = pa.BufferReader(msg['result'])
+    elif msg.get('result_path') and os.path.exists(msg['result_path']):
+        source = pa.memory_map(msg['result_path'], 'r')
+    else:
+        return None
+    return pa.ipc.open_stream(source).read_all().to_pandas()
+
+
+def chat_spill_dir(session_id):
+    """Per-session spill directory, so a closed session's files can be removed together."""
+    return os.path.join(CHAT_SPILL_DIR, session_id)
+
+
+def remove_chat_spill_dir(session_id):
+    shutil.rmtree(chat_spill_dir(session_id), ignore_errors=True)
+
+
+def spill_chat_result(msg, session_id=None):
+    """Move a message's result bytes to a temp file in the session's spill directory; returns the bytes freed."""
+    spill_dir = chat_spill_dir(session_id or get_current_session_id())
+    os.makedirs(spill_dir, exist_ok=True)
+    handle, path = tempfile.mkstemp(suffix='.arrow', dir=spill_dir)
+    with os.fdopen(handle, 'wb') as spill_file:
+        spill_file.write(msg['result'])
+    freed = len(msg['result'])
+    msg['result'], msg['result_path'] = None, path
+    return freed
+
+
+def drop_chat_result(msg):
+    """Discard a message's stored result, in memory or spilled; returns whether one was held."""
+    held = msg.get('result') is not None or bool(msg.get('result_path'))
+    if msg.get('result_path'):
+        try:
+            os.remove(msg['result_path'])
+        except OSError:
+            pass
+    msg['result'], msg['result_path'] = None, None
+    return held
+
+
+def append_chat_message(history, role, content, data=None):
+    """Append a message and enforce the history bounds: message cap first, then the in-memory result budget."""
+    msg = {
+        'id': history[-1]['id'] + 1 if history else 1,
+        'role': role,
+        'content': content,
+        'timestamp': datetime.now().strftime('%H:%M:%S'),
+        'result': None,
+        'result_path': None,
+        'result_rows': 0,
+        'players': [],
+    }
+    if data is not None:
+        msg['result'] = pack_chat_result(data)
+        msg['result_rows'] = len(data)
+        if 'player_name' in data.columns:
+            msg['players'] = data['player_name'].dropna().astype(str).unique()[:3].tolist()
+    history.append(msg)
+
+    while len(history) > CHAT_HISTORY_MAX_MESSAGES:
+        drop_chat_result(history.pop(0))
+    in_memory = sum(len(entry['result']) for entry in history if entry.get('result') is not None)
+    for entry in history[:-1]:
+        if in_memory <= CHAT_RESULT_MEMORY_BUDGET:
+            break
+        if entry.get('result') is not None:
+            in_memory -= spill_chat_result(entry)
+    return msg
+
+
+def clear_chat_history(history):
+    for msg in history:
+        drop_chat_result(msg)
+    history.clear()
+
+
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 if 'selected_player' not in st.session_state:
@@ -208,10 +836,8 @@ if 'plot_click_player' not in st.session_state:
     st.session_state.plot_click_player = None
 if 'analytics_click_player' not in st.session_state:
     st.session_state.analytics_click_player = None
-if 'trade_proposals' not in st.session_state:
-    st.session_state.trade_proposals = []
-if 'trade_counter' not in st.session_state:
-    st.session_state.trade_counter = 1
+
+register_session()
 
 # Custom CSS
 st.markdown("""
@@ -324,327 +950,2836 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+def apply_contract_schema(df, schema=None):
+    """Cast columns to the compact contract schema; columns outside the schema are left untouched."""
+    schema = schema or CONTRACT_SCHEMA
+    for col, dtype in schema.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype.startswith('int'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(dtype)
+        elif dtype.startswith('float'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def with_contract_terms(df):
+    """Add default ``contract_years`` and ``annual_raise`` columns when the data does not carry them."""
+    defaults = {'contract_years': DEFAULT_CONTRACT_YEARS, 'annual_raise': DEFAULT_ANNUAL_RAISE}
+    missing = {col: value for col, value in defaults.items() if col not in df.columns}
+    return df.assign(**missing) if missing else df
+
+
+def build_memory_report(before_df, after_df):
+    """Compare per-column dtype and deep memory usage before and after the schema is applied."""
+    before_bytes = before_df.memory_usage(index=False, deep=True)
+    after_bytes = after_df.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({
+        'column': before_df.columns,
+        'dtype_before': [str(before_df[col].dtype) for col in before_df.columns],
+        'dtype_after': [str(after_df[col].dtype) if col in after_df.columns else '' for col in before_df.columns],
+        'bytes_before': before_bytes.reindex(before_df.columns).to_numpy(),
+        'bytes_after': after_bytes.reindex(before_df.columns).fillna(0).to_numpy(),
+    })
+    report['bytes_saved'] = report['bytes_before'] - report['bytes_after']
+    return report
+
+
+def freeze_frame(df):
+    """Rebuild ``df`` over read-only column arrays so a process-wide shared copy cannot be edited in place.
+
+    Numpy views taken from the frame (``to_numpy()``, ``.values``) refuse writes. Writes through
+    pandas (``df.loc[...] = ...``, ``df[col] = ...``) are copy-on-write: they give the frame being
+    written its own copy and never reach the shared arrays. Callers get a shallow view from
+    :func:`load_data`, so even those writes stay in the caller's frame.
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy(copy=True)
+            codes.flags.writeable = False
+            columns[col] = pd.Categorical.from_codes(codes, dtype=series.dtype)
+        elif isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+            values = series.to_numpy(copy=True)
+            values.flags.writeable = False
+            columns[col] = values
+        else:
+            columns[col] = series.array
+    frozen = pd.DataFrame(columns, index=df.index, copy=False)
+    frozen.attrs.update(df.attrs)
+    return frozen
+
+
+# Derived metrics are declared with the columns they read and computed lazily, in one
+# vectorized pass per metric, the first time a page asks for them. Results are cached
+# process-wide keyed on a fingerprint of their input columns, so they are recomputed only
+# when those inputs change.
+DERIVED_METRICS = {}
+
+
+def register_metric(outputs, inputs):
+    """Register a vectorized function deriving ``outputs`` columns from ``inputs`` columns."""
+    def decorator(func):
+        spec = {'outputs': tuple(outputs), 'inputs': tuple(inputs), 'func': func}
+        for output in outputs:
+            DERIVED_METRICS[output] = spec
+        return func
+    return decorator
+
+
+def _numeric_column(df, col):
+    if col in df.columns:
+        return pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return pd.Series(0.0, index=df.index)
+
+
+@register_metric(outputs=['dollars_per_point'], inputs=['salary_usd', 'pts'])
+def _dollars_per_point(df):
+    points = _numeric_column(df, 'pts')
+    return {'dollars_per_point': (_numeric_column(df, 'salary_usd') / points.where(points != 0)).fillna(0).round(2)}
+
+
+@register_metric(outputs=['dollars_per_game'], inputs=['salary_usd', 'gp'])
+def _dollars_per_game(df):
+    games = _numeric_column(df, 'gp')
+    return {'dollars_per_game': (_numeric_column(df, 'salary_usd') / games.where(games != 0)).fillna(0).round(2)}
+
+
+@register_metric(
+    outputs=['norm_pts', 'norm_reb', 'norm_assists', 'contract_efficiency_score'],
+    inputs=['salary_usd', 'pts', 'reb', 'assists'],
+)
+def _contract_efficiency(df):
+    norms = {}
+    for col in CES_BASIS_COLUMNS:
+        values = _numeric_column(df, col)
+        norms[f'norm_{col}'] = values / max(values.max(), 1)
+
+    salary_millions = _numeric_column(df, 'salary_usd') / 1_000_000
+    normalized_performance = sum(norms[f'norm_{col}'] * weight for col, weight in CES_WEIGHTS.items())
+    ces = (normalized_performance / salary_millions.where(salary_millions != 0)).fillna(0)
+    return {**norms, 'contract_efficiency_score': ces}
+
+
+@register_metric(outputs=['contract_value_label'], inputs=['contract_efficiency_score'])
+def _contract_value_label(df):
+    scores = df['contract_efficiency_score']
+    lower_cutoff, upper_cutoff = scores.quantile(list(VALUE_TIER_QUANTILES)).to_list()
+    labels = np.select([scores >= upper_cutoff, scores >= lower_cutoff], ['Underpaid', 'Fair'], default='Overpaid')
+    return {'contract_value_label': pd.Series(pd.Categorical(labels, categories=VALUE_LABELS), index=df.index)}
+
+
+def fingerprint_columns(df, columns):
+    """Content fingerprint of the given columns (and row labels) of ``df``."""
+    present = [col for col in columns if col in df.columns]
+    if present:
+        hashed = pd.util.hash_pandas_object(df[present], index=True)
+    else:
+        hashed = pd.util.hash_pandas_object(df.index.to_series(), index=False)
+    return (len(df), tuple(present), f"{int(hashed.sum()):x}")
+
+
+def resolve_metric_plan(names):
+    """Order the metric specs needed for ``names`` so that dependencies come first."""
+    plan = []
+
+    def visit(name):
+        spec = DERIVED_METRICS.get(name)
+        if spec is None or any(spec is planned for planned in plan):
+            return
+        for dependency in spec['inputs']:
+            visit(dependency)
+        plan.append(spec)
+
+    for name in names:
+        visit(name)
+    return plan
+
+
+def with_metrics(df, names):
+    """Return ``df`` with the requested derived columns attached, computing each only when its inputs changed."""
+    result = df
+    for spec in resolve_metric_plan(names):
+        key = ('metric', spec['outputs'], fingerprint_columns(result, spec['inputs']))
+        columns = get_cached_artifact(key, lambda: spec['func'](result))
+        result = result.assign(**columns)
+    return result
+
+
 def ensure_salary_efficiency_columns(df):
     """Guarantee salary efficiency metrics exist and are numeric for visualizations."""
-    numeric_cols = ['salary_usd', 'pts', 'gp']
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    if 'dollars_per_point' in df.columns:
-        df['dollars_per_point'] = pd.to_numeric(df['dollars_per_point'], errors='coerce')
-    base_points = df['pts'].replace({0: pd.NA}) if 'pts' in df.columns else pd.NA
-    df['dollars_per_point'] = df.get('dollars_per_point', pd.NA).combine_first(
-        df.get('salary_usd', pd.NA) / base_points
+    return with_metrics(df, ['dollars_per_point', 'dollars_per_game'])
+
+
+def calculate_contract_efficiency(df):
+    """Derive the Contract Efficiency Score (CES) with normalized production and value tiers."""
+    return with_metrics(df, ['contract_efficiency_score', 'contract_value_label'])
+
+
+def compute_data_version(df):
+    """Fingerprint a frame's contents so derived artifacts can be cached per data version."""
+    return f"{int(pd.util.hash_pandas_object(df, index=True).sum()):x}"
+
+
+@st.cache_resource
+def get_load_reports():
+    """Schema memory reports recorded by load_shared_data, keyed by data version."""
+    return {}
+
+
+def seed_metric_cache(df):
+    """Register derived columns already present in ``df`` so :func:`with_metrics` reuses them as-is."""
+    for spec in {id(spec): spec for spec in DERIVED_METRICS.values()}.values():
+        if all(col in df.columns for col in spec['outputs']):
+            key = ('metric', spec['outputs'], fingerprint_columns(df, spec['inputs']))
+            cache_put(key, {col: df[col] for col in spec['outputs']})
+
+
+def write_prepared_dataset(path):
+    """Write the typed dataset and every derived metric to an uncompressed Arrow IPC file; returns the row count.
+
+    The file is written next to ``path`` and swapped in atomically, so app processes that
+    already mapped the previous version keep reading it until they restart.
+    """
+    import pyarrow as pa
+
+    df = apply_contract_schema(with_contract_terms(pd.read_excel(SOURCE_DATASET)))
+    prepared = with_metrics(df, list(DERIVED_METRICS))
+    table = pa.Table.from_pandas(prepared, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b'data_version': compute_data_version(df).encode(),
+        b'base_columns': json.dumps(list(df.columns)).encode(),
+    })
+    staging_path = f"{path}.tmp"
+    with pa.OSFile(staging_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(staging_path, path)
+    return table.num_rows
+
+
+def map_prepared_dataset(path):
+    """Memory-map a prepared dataset read-only.
+
+    Numeric columns are zero-copy views of the mapped file, so every app process mapping it
+    shares one physical copy through the OS page cache. The derived metrics in the file seed
+    the metric cache and the base columns are returned.
+    """
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    metadata = table.schema.metadata or {}
+    prepared = table.to_pandas(split_blocks=True)
+    seed_metric_cache(prepared)
+    df = prepared[json.loads(metadata[b'base_columns'])]
+    df.attrs['data_version'] = metadata[b'data_version'].decode()
+    df.attrs['prepared_dataset'] = path
+    return df
+
+
+@st.cache_resource
+def load_shared_data():
+    """Load the base dataset once per process; every session shares the same read-only arrays.
+
+    When ``NBA_PREPARED_DATASET`` names a file written by :func:`write_prepared_dataset`
+    the dataset is memory-mapped from it instead of read from Excel.
+    """
+    prepared_path = os.environ.get(PREPARED_DATASET_ENV)
+    if prepared_path:
+        return map_prepared_dataset(prepared_path)
+
+    df = pd.read_excel(SOURCE_DATASET)
+    untyped_df = df.copy()
+    df = freeze_frame(apply_contract_schema(with_contract_terms(df)))
+    df.attrs['data_version'] = compute_data_version(df)
+    get_load_reports()[df.attrs['data_version']] = build_memory_report(untyped_df, df)
+    return df
+
+
+def load_data():
+    """Zero-copy view of the shared base dataset.
+
+    Each call returns a new frame object over the shared arrays. Under pandas copy-on-write an
+    edit to it copies only the columns it touches, so no session can change what the others see.
+    """
+    return load_shared_data().copy(deep=False)
+
+
+# Every derived result (metric columns, leaderboards, indexes, figures, team totals) lives in
+# one process-wide LRU keyed on what it was computed from: the producing function, its
+# arguments and the content fingerprint (``data_version``) of the frame it read. Results for
+# unchanged data are never recomputed, and least recently used entries are evicted once the
+# entry count or the estimated deep size exceeds its bound.
+_CACHE_MISS = object()
+
+
+@st.cache_resource
+def get_derived_cache():
+    """Process-wide LRU store of derived results with entry and byte bounds."""
+    return {
+        'lock': threading.Lock(),
+        'entries': OrderedDict(),
+        'sizes': {},
+        'bytes': 0,
+        'hits': 0,
+        'misses': 0,
+        'evictions': 0,
+    }
+
+
+def cache_get(key, default=None):
+    """Return the cached value for ``key`` and mark it recently used, or ``default``."""
+    cache = get_derived_cache()
+    with cache['lock']:
+        if key not in cache['entries']:
+            cache['misses'] += 1
+            return default
+        cache['hits'] += 1
+        cache['entries'].move_to_end(key)
+        return cache['entries'][key]
+
+
+def cache_put(key, value):
+    """Store ``value`` under ``key``, evicting least recently used entries past the bounds."""
+    size = deep_sizeof(value)
+    cache = get_derived_cache()
+    with cache['lock']:
+        entries = cache['entries']
+        if key in entries:
+            cache['bytes'] -= cache['sizes'][key]
+        entries[key] = value
+        entries.move_to_end(key)
+        cache['sizes'][key] = size
+        cache['bytes'] += size
+        while len(entries) > 1 and (
+            len(entries) > DERIVED_CACHE_MAX_ENTRIES or cache['bytes'] > DERIVED_CACHE_MAX_BYTES
+        ):
+            evicted_key, _ = entries.popitem(last=False)
+            cache['bytes'] -= cache['sizes'].pop(evicted_key)
+            cache['evictions'] += 1
+    return value
+
+
+def get_cached_artifact(key, builder):
+    """Return the cached artifact for ``key``, building and storing it on first use."""
+    artifact = cache_get(key, _CACHE_MISS)
+    if artifact is _CACHE_MISS:
+        artifact = cache_put(key, builder())
+    return artifact
+
+
+def cached_call(func, df, *args):
+    """Memoize ``func(df, *args)`` on ``(function, args, data version of df)``.
+
+    ``df`` must be a frame whose ``data_version`` attr describes all of its rows (the loaded
+    dataset or a contract snapshot's records), never a filtered slice of one; frames without
+    a version are computed directly.
+    """
+    version = df.attrs.get('data_version')
+    if version is None:
+        return func(df, *args)
+    return get_cached_artifact((func.__qualname__, args, version), lambda: func(df, *args))
+
+
+def leaderboard_rows(df, leaderboards, metric, top_n, columns):
+    """Fetch the rows for a metric's top-n entries without sorting the frame."""
+    labels = [label for _, _, label in top_k(leaderboards, metric, top_n)]
+    return df.loc[labels, columns]
+
+
+def build_hall_of_fame_html(df, leaderboards, top_n=5):
+    """Render the Hall of Fame scorer cards as HTML snippets."""
+    top_players = leaderboard_rows(
+        df, leaderboards, 'pts', top_n, ['player_name', 'player_id', 'team_name', 'pts', 'salary_usd']
+    )
+
+    medals = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣"]
+    colors = ["gold", "silver", "bronze", "", ""]
+
+    cards = []
+    for idx, (_, row) in enumerate(top_players.iterrows()):
+        salary_m = row['salary_usd'] / 1000000
+        img_url = get_player_image_url(row['player_name'], row['player_id'])
+        team_colors = get_team_colors(row['team_name'])
+        medal = medals[idx] if idx < len(medals) else f"{idx + 1}."
+        color_class = colors[idx] if idx < len(colors) else ""
+
+        cards.append(f"""
+            <div class='top-player {color_class}' style='background: linear-gradient(135deg, {team_colors['primary']} 0%, {team_colors['secondary']} 100%); color: white;'>
+                <span style='font-size: 1.5em; margin-right: 10px;'>{medal}</span>
+                <img src="{img_url}" class="player-img">
+                <div style='flex: 1;'>
+                    <strong style='font-size: 1.2em;'>{row['player_name']}</strong>
+                    <div style='font-size: 0.9em; opacity: 0.9;'>
+                        ⭐ {row['pts']:.1f} pts | 🏀 {row['team_name']} | 💰 ${salary_m:.1f}M
+                    </div>
+                </div>
+            </div>
+        """)
+    return cards
+
+
+def build_top_scorers_figure(df, leaderboards, top_n=10):
+    # Leaderboards keep each player's best stat line, so duplicate rows never show identical values
+    top_ppg = leaderboard_rows(df, leaderboards, 'pts', top_n, ['player_name', 'pts', 'team_name'])
+
+    ppg_fig = px.bar(
+        top_ppg,
+        x='player_name',
+        y='pts',
+        color='team_name',
+        title=f'Top {top_n} Scorers (PPG)',
+        labels={'player_name': 'Player', 'pts': 'Points per Game', 'team_name': 'Team'},
+        text='pts',
+    )
+    ppg_fig.update_traces(text=top_ppg['pts'].apply(lambda pts: f"{pts:.1f}"), textposition='outside')
+    ppg_fig.update_layout(xaxis_tickangle=-45, height=400, showlegend=False)
+    return ppg_fig
+
+
+def build_top_salaries_figure(df, leaderboards, top_n=10):
+    top_salary = leaderboard_rows(df, leaderboards, 'salary_usd', top_n, ['player_name', 'salary_usd', 'team_name'])
+
+    salary_fig = px.bar(
+        top_salary,
+        x='player_name',
+        y='salary_usd',
+        color='team_name',
+        title=f'Top {top_n} Highest Salaries',
+        labels={'player_name': 'Player', 'salary_usd': 'Salary (USD)', 'team_name': 'Team'},
+        text='salary_usd',
+    )
+    salary_fig.update_traces(
+        text=top_salary['salary_usd'].apply(lambda val: f"${val/1_000_000:,.1f}M"),
+        textposition='outside',
+    )
+    salary_fig.update_layout(
+        xaxis_tickangle=-45,
+        height=400,
+        yaxis_tickformat='$,.0f',
+        showlegend=False,
+    )
+    return salary_fig
+
+
+def get_project_summary_artifacts(df):
+    """Hall of Fame cards and the top scorer/salary figures for the loaded dataset, built once per data version."""
+    data_version = df.attrs.get('data_version')
+    base_leaderboards = get_base_leaderboards(df)
+    return (
+        get_cached_artifact(
+            ('hall_of_fame', data_version, 5), lambda: build_hall_of_fame_html(df, base_leaderboards, top_n=5)
+        ),
+        get_cached_artifact(
+            ('top_scorers', data_version, 10), lambda: build_top_scorers_figure(df, base_leaderboards, top_n=10)
+        ),
+        get_cached_artifact(
+            ('top_salaries', data_version, 10), lambda: build_top_salaries_figure(df, base_leaderboards, top_n=10)
+        ),
+    )
+
+
+def get_ces_basis(df):
+    """Stat maxima CES normalizes against; when they move, every player's CES moves with them."""
+    return tuple(float(df[col].max()) if col in df.columns else 0.0 for col in CES_BASIS_COLUMNS)
+
+
+def build_leaderboard(df, metric, by_team=True):
+    """Materialize a descending leaderboard for one metric with one entry per row.
+
+    Entries are ``(-value, player_name, row_label)`` tuples in ascending order, so ranked
+    walks start at the top and ties break alphabetically. Per-player reads skip a player's
+    later rows, which leaves each player at their best row.
+    """
+    board = {'overall': [], 'teams': {}, 'entries': {}, 'by_team': by_team}
+    if metric not in df.columns:
+        return board
+
+    ranked_rows = df[df[metric].notna()]
+    for label, name, team, value in zip(
+        ranked_rows.index, ranked_rows['player_name'], ranked_rows['team_name'], ranked_rows[metric]
+    ):
+        item = (-float(value), name, label)
+        board['overall'].append(item)
+        board['entries'][label] = (item, team)
+        if by_team:
+            board['teams'].setdefault(team, []).append(item)
+
+    board['overall'].sort()
+    for team_items in board['teams'].values():
+        team_items.sort()
+    return board
+
+
+def build_leaderboards(df, metrics=None, by_team=True):
+    """Build materialized leaderboards for every tracked metric present in ``df``."""
+    metrics = metrics or LEADERBOARD_METRICS
+    return {
+        'metrics': {metric: build_leaderboard(df, metric, by_team) for metric in metrics if metric in df.columns},
+        'ces_basis': get_ces_basis(df),
+    }
+
+
+def _remove_leaderboard_entry(board, label):
+    existing = board['entries'].pop(label, None)
+    if existing is None:
+        return
+    item, team = existing
+    for items in [board['overall'], board['teams'].get(team)]:
+        if items:
+            idx = bisect_left(items, item)
+            if idx < len(items) and items[idx] == item:
+                del items[idx]
+
+
+def _insert_leaderboard_entry(board, label, name, team, value):
+    if pd.isna(value):
+        return
+    item = (-float(value), name, label)
+    board['entries'][label] = (item, team)
+    insort(board['overall'], item)
+    if board['by_team']:
+        insort(board['teams'].setdefault(team, []), item)
+
+
+def update_leaderboards(leaderboards, df, labels):
+    """Apply contract changes to materialized leaderboards in place.
+
+    ``labels`` are the row labels created, edited or deleted; each one is removed and, if it
+    is still in ``df``, reinserted at its new value. The player's other rows are untouched. The
+    CES board is rebuilt only when the stat maxima it is normalized against move.
+    """
+    new_basis = get_ces_basis(df)
+    rebuild_ces = new_basis != leaderboards.get('ces_basis')
+    leaderboards['ces_basis'] = new_basis
+
+    for metric, board in leaderboards['metrics'].items():
+        if metric == 'contract_efficiency_score' and rebuild_ces:
+            leaderboards['metrics'][metric] = build_leaderboard(df, metric, board['by_team'])
+            continue
+        for label in labels:
+            _remove_leaderboard_entry(board, label)
+            if label in df.index:
+                row = df.loc[label]
+                _insert_leaderboard_entry(board, label, row['player_name'], row['team_name'], row[metric])
+    return leaderboards
+
+
+def top_k(leaderboards, metric, k, team=None):
+    """Return the top ``k`` ``(player_name, value, row_label)`` entries for a metric, one per player."""
+    board = leaderboards['metrics'][metric]
+    items = board['overall'] if team is None else board['teams'].get(team, [])
+    top, seen = [], set()
+    for neg_value, name, label in items:
+        if len(top) == k:
+            break
+        if name not in seen:
+            seen.add(name)
+            top.append((name, -neg_value, label))
+    return top
+
+
+def iter_ranked_labels(leaderboards, metric, team=None, ascending=False):
+    """Yield row labels in leaderboard order without materializing the full ranking."""
+    board = leaderboards['metrics'][metric]
+    items = board['overall'] if team is None else board['teams'].get(team, [])
+    ordered = reversed(items) if ascending else items
+    for _, _, label in ordered:
+        yield label
+
+
+def paginate_frame(frame, sort_by, ascending=False, page=1, page_size=25):
+    """Sort and slice a small frame server-side; returns the page, total rows, page count, and page number."""
+    total_rows = len(frame)
+    total_pages = max(1, -(-total_rows // page_size))
+    page = min(max(1, page), total_pages)
+    start = (page - 1) * page_size
+    page_df = frame.sort_values(sort_by, ascending=ascending, kind='stable').iloc[start:start + page_size]
+    return page_df, total_rows, total_pages, page
+
+
+def filter_leaderboard(contract_df, leaderboards, sort_by, ascending=False, team=None, tier=None):
+    """Filter mask plus an iterator over the matching row labels in sorted order.
+
+    Metrics with a materialized leaderboard are walked in ranked order (the team board when
+    a team filter is set) with rows missing the metric last, as ``sort_values`` places them;
+    other columns fall back to sorting the filtered frame. Both paths yield exactly the rows
+    the mask counts.
+    """
+    mask = pd.Series(True, index=contract_df.index)
+    if team:
+        mask &= contract_df['team_name'] == team
+    if tier:
+        mask &= contract_df['contract_value_label'] == tier
+
+    if sort_by not in leaderboards['metrics']:
+        return mask, iter(contract_df[mask].sort_values(sort_by, ascending=ascending, kind='stable').index)
+    ranked = iter_ranked_labels(leaderboards, sort_by, team=team or None, ascending=ascending)
+    if tier:
+        tiers = contract_df['contract_value_label']
+        ranked = (label for label in ranked if tiers.at[label] == tier)
+    unranked = contract_df.index[mask & contract_df[sort_by].isna()]
+    return mask, chain(ranked, unranked)
+
+
+def get_leaderboard_page(contract_df, leaderboards, sort_by, ascending=False, team=None, tier=None, page=1, page_size=25):
+    """Return one page of the contract leaderboard, sorted and filtered server-side.
+
+    Only the requested slice of labels is pulled from the frame; the page count comes from
+    the same filter the labels are walked under.
+    """
+    mask, labels = filter_leaderboard(contract_df, leaderboards, sort_by, ascending, team, tier)
+    total_rows = int(mask.sum())
+    total_pages = max(1, -(-total_rows // page_size))
+    page = min(max(1, page), total_pages)
+    start = (page - 1) * page_size
+    page_df = contract_df.loc[list(islice(labels, start, start + page_size))]
+    return page_df, total_rows, total_pages, page
+
+
+def iter_leaderboard_chunks(contract_df, leaderboards, sort_by, ascending=False, team=None, tier=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield every contract matching the filters in sorted order, ``chunk_rows`` rows at a time."""
+    _, ranked = filter_leaderboard(contract_df, leaderboards, sort_by, ascending, team, tier)
+    labels = list(islice(ranked, chunk_rows))
+    yield contract_df.loc[labels]
+    while len(labels) == chunk_rows:
+        labels = list(islice(ranked, chunk_rows))
+        if labels:
+            yield contract_df.loc[labels]
+
+
+def iter_frame_chunks(frame, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield consecutive row slices of ``frame``; an empty frame yields one empty slice."""
+    yield frame.iloc[:chunk_rows]
+    for start in range(chunk_rows, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+
+def iter_csv_export(frames, columns=None):
+    """Stream frame chunks as UTF-8 CSV bytes: the header once, then one block per chunk."""
+    header = True
+    for frame in frames:
+        if columns:
+            frame = frame[list(columns)].rename(columns=columns)
+        yield frame.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+
+def iter_parquet_export(frames, columns=None):
+    """Stream frame chunks as a Parquet file, one row group per chunk.
+
+    Row groups are written to a spooled temp file and the newly written bytes are yielded
+    after each one, followed by the footer.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MEMORY)
+    emitted = 0
+
+    def drain():
+        nonlocal emitted
+        spool.seek(emitted)
+        data = spool.read()
+        emitted += len(data)
+        return data
+
+    writer = None
+    try:
+        for frame in frames:
+            if columns:
+                frame = frame[list(columns)].rename(columns=columns)
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(spool, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            yield drain()
+        if writer is not None:
+            writer.close()
+            yield drain()
+    finally:
+        spool.close()
+
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv_export, 'text/csv'),
+    'parquet': (iter_parquet_export, 'application/vnd.apache.parquet'),
+}
+
+
+def spool_export(chunks):
+    """Collect streamed export bytes in a spooled temp file, rewound for reading."""
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MEMORY)
+    for chunk in chunks:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def render_export_buttons(iter_frames, file_stem, key, columns=None):
+    """CSV and Parquet download buttons; the file is streamed from ``iter_frames()`` only when clicked.
+
+    Deferred (callable) ``data`` needs Streamlit 1.52 or later, which requirements.txt pins.
+    """
+    for col, (fmt, (exporter, mime)) in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS.items()):
+        with col:
+            st.download_button(
+                f"⬇️ {fmt.upper()}",
+                data=lambda exporter=exporter: spool_export(exporter(iter_frames(), columns)),
+                file_name=f"{file_stem}.{fmt}",
+                mime=mime,
+                key=f"{key}_{fmt}",
+                use_container_width=True,
+            )
+
+
+def render_page_controls(total_rows, page_size, key):
+    """Page number input whose range follows the current filters."""
+    total_pages = max(1, -(-total_rows // page_size))
+    if st.session_state.get(key, 1) > total_pages:
+        st.session_state[key] = total_pages
+    page = st.number_input(
+        f"Page (of {total_pages})", min_value=1, max_value=total_pages, value=1, step=1, key=key
+    )
+    return int(page)
+
+
+def get_base_leaderboards(df):
+    """Leaderboards for the loaded dataset, built once per data version."""
+    return cached_call(build_leaderboards, df)
+
+
+def _rank_primary_labels(df, labels):
+    """Order candidate rows for one player: latest season, then highest salary, then frame order."""
+    labels = sorted(labels, key=lambda label: df.index.get_loc(label))
+    if 'season' not in df.columns:
+        return labels
+    return sorted(
+        labels,
+        key=lambda label: (str(df.at[label, 'season']), float(df.at[label, 'salary_usd'])),
+        reverse=True,
+    )
+
+
+def build_player_index(df):
+    """Primary-key index over ``player_id`` with a name -> id map for O(1) single-player access.
+
+    Players with several rows (multiple seasons or duplicate entries) resolve to their most
+    recent season, then highest salary, then first row in frame order. A name shared by
+    several ids resolves to the id whose primary row ranks first under the same rule.
+    """
+    ordered = df.sort_values(['season', 'salary_usd'] if 'season' in df.columns else ['salary_usd'],
+                             ascending=False, kind='stable')
+    index = {'rows': {}, 'by_id': {}, 'name_ids': {}, 'name_to_id': {}, 'max_id': 0}
+    for label, player_id, name in zip(ordered.index, ordered['player_id'], ordered['player_name']):
+        player_id = int(player_id)
+        index['rows'].setdefault(player_id, []).append(label)
+        index['by_id'].setdefault(player_id, label)
+        if player_id not in index['name_ids'].setdefault(name, []):
+            index['name_ids'][name].append(player_id)
+        index['name_to_id'].setdefault(name, player_id)
+        index['max_id'] = max(index['max_id'], player_id)
+    return index
+
+
+def _player_labels(index, name):
+    """Every row label indexed under a player name, across all of its ids."""
+    return [label for player_id in index['name_ids'].get(name, []) for label in index['rows'].get(player_id, [])]
+
+
+def _refresh_player_id(index, df, player_id):
+    labels = [label for label in index['rows'].get(player_id, []) if label in df.index]
+    if not labels:
+        index['rows'].pop(player_id, None)
+        index['by_id'].pop(player_id, None)
+        return
+    labels = _rank_primary_labels(df, labels)
+    index['rows'][player_id] = labels
+    index['by_id'][player_id] = labels[0]
+
+
+def _refresh_player_name(index, df, name):
+    player_ids = [pid for pid in index['name_ids'].get(name, []) if pid in index['by_id']]
+    if not player_ids:
+        index['name_ids'].pop(name, None)
+        index['name_to_id'].pop(name, None)
+        return
+    primary_labels = _rank_primary_labels(df, [index['by_id'][pid] for pid in player_ids])
+    label_to_id = {index['by_id'][pid]: pid for pid in player_ids}
+    index['name_ids'][name] = [label_to_id[label] for label in primary_labels]
+    index['name_to_id'][name] = index['name_ids'][name][0]
+
+
+def update_player_index(index, df, changes):
+    """Keep the player index consistent after contract edits.
+
+    ``changes`` maps player name to the row label just created or edited, or ``None`` when
+    only deletions touched the player; their remaining rows are re-ranked either way.
+    """
+    for name, label in changes.items():
+        player_ids = set(index['name_ids'].get(name, []))
+        if label is not None:
+            player_id = int(df.at[label, 'player_id'])
+            player_ids.add(player_id)
+            if label not in index['rows'].setdefault(player_id, []):
+                index['rows'][player_id].append(label)
+            if player_id not in index['name_ids'].setdefault(name, []):
+                index['name_ids'][name].append(player_id)
+            index['max_id'] = max(index['max_id'], player_id)
+        for player_id in player_ids:
+            _refresh_player_id(index, df, player_id)
+        _refresh_player_name(index, df, name)
+    return index
+
+
+def get_player_row(df, player_index, player_name=None, player_id=None):
+    """Return a player's primary row via hash lookups, or ``None`` when the player is not in ``df``."""
+    if player_id is None:
+        player_id = player_index['name_to_id'].get(player_name)
+    label = player_index['by_id'].get(player_id)
+    if label is None or label not in df.index:
+        return None
+    return df.loc[label]
+
+
+def get_base_player_index(df):
+    """Player index for the loaded dataset, built once per data version."""
+    return cached_call(build_player_index, df)
+
+
+# Salary prediction: ridge regression of salary on box-score stats, solved in closed form from
+# the sufficient statistics X'X, X'y and y'y. Contract edits add and subtract the changed rows'
+# outer products instead of refitting, and predicting the whole league is one matrix multiply.
+def salary_design_matrix(df):
+    """Intercept column plus the model features as a float64 matrix; missing stats count as 0."""
+    columns = [np.ones(len(df))]
+    columns += [_numeric_column(df, col).to_numpy(dtype='float64') for col in SALARY_MODEL_FEATURES]
+    return np.column_stack(columns)
+
+
+def _salary_targets(df):
+    return _numeric_column(df, 'salary_usd').to_numpy(dtype='float64')
+
+
+def solve_salary_model(stats, alpha=SALARY_MODEL_ALPHA):
+    """Solve ``(X'X + alpha*D) b = X'y`` with an unpenalized intercept and derive R² from the same statistics.
+
+    ``D`` holds each feature's variance, read off X'X, so the fit equals ridge on standardized
+    features while coefficients stay in raw units and edits still only touch the statistics.
+    """
+    if stats['n'] == 0:
+        return {**stats, 'coef': np.zeros(len(stats['xty'])), 'r2': 0.0}
+    means = stats['xtx'][0] / stats['n']
+    variances = np.diag(stats['xtx']) / stats['n'] - means ** 2
+    penalty = np.diag(alpha * np.where(variances > 0, variances, 1.0))
+    penalty[0, 0] = 0.0
+    coef = np.linalg.solve(stats['xtx'] + penalty, stats['xty'])
+    sse = stats['yty'] - 2 * coef @ stats['xty'] + coef @ stats['xtx'] @ coef
+    sst = stats['yty'] - stats['xty'][0] ** 2 / stats['n']
+    return {**stats, 'coef': coef, 'r2': float(1 - sse / sst) if sst > 0 else 0.0}
+
+
+def build_salary_model(df):
+    """Fit the salary model from scratch in one pass over ``df``."""
+    X = salary_design_matrix(df)
+    y = _salary_targets(df)
+    return solve_salary_model({'xtx': X.T @ X, 'xty': X.T @ y, 'yty': float(y @ y), 'n': len(y)})
+
+
+def update_salary_model(model, removed_df, added_df):
+    """Re-solve the model after edits by downdating ``removed_df`` rows and updating ``added_df`` rows."""
+    X_out, y_out = salary_design_matrix(removed_df), _salary_targets(removed_df)
+    X_in, y_in = salary_design_matrix(added_df), _salary_targets(added_df)
+    return solve_salary_model({
+        'xtx': model['xtx'] + X_in.T @ X_in - X_out.T @ X_out,
+        'xty': model['xty'] + X_in.T @ y_in - X_out.T @ y_out,
+        'yty': model['yty'] + float(y_in @ y_in - y_out @ y_out),
+        'n': model['n'] + len(y_in) - len(y_out),
+    })
+
+
+def predict_salaries(df, model):
+    """Predicted salary for every row of ``df``, floored at zero."""
+    return np.maximum(salary_design_matrix(df) @ model['coef'], 0.0)
+
+
+def get_base_salary_model(df):
+    """Salary model for the loaded dataset, fitted once per data version."""
+    return cached_call(build_salary_model, df)
+
+
+def with_salary_predictions(df, model=None):
+    """Attach ``predicted_salary``, using the loaded dataset's model unless ``model`` is given."""
+    model = model if model is not None else get_base_salary_model(df)
+    return df.assign(predicted_salary=predict_salaries(df, model))
+
+
+# Comparable contracts: a KD-tree over the CES stat space (plus optional extra stats scaled by
+# their maximum). The tree is an array of nodes over a permutation of row positions, so it
+# is immutable once built; contract edits tombstone the old rows and park new vectors in a
+# small buffer that queries scan directly, and the tree is rebuilt only when the buffer grows
+# past a fraction of the data or the CES basis moves.
+def comps_matrix(df, features, scales):
+    """Stat vectors for ``df`` in comps space: each feature divided by its scale."""
+    if not len(features):
+        return np.empty((len(df), 0))
+    return np.column_stack([
+        _numeric_column(df, col).to_numpy(dtype='float64') / scale for col, scale in zip(features, scales)
+    ])
+
+
+def build_kd_tree(points, leaf_size=COMPS_LEAF_SIZE):
+    """Split on the widest dimension at the median until leaves hold ``leaf_size`` points.
+
+    Returns ``(order, nodes)``: a permutation of point positions and nodes of
+    ``(start, end, dim, split, left, right)`` over slices of it; leaves have ``dim == -1``.
+    """
+    order = np.arange(len(points))
+    nodes = []
+
+    def build(start, end):
+        node_id = len(nodes)
+        nodes.append(None)
+        if end - start <= leaf_size:
+            nodes[node_id] = (start, end, -1, 0.0, -1, -1)
+            return node_id
+        positions = order[start:end]
+        dim = int(np.ptp(points[positions], axis=0).argmax())
+        mid = (end - start) // 2
+        order[start:end] = positions[np.argpartition(points[positions, dim], mid)]
+        split = float(points[order[start + mid], dim])
+        left = build(start, start + mid)
+        right = build(start + mid, end)
+        nodes[node_id] = (start, end, dim, split, left, right)
+        return node_id
+
+    if len(points):
+        build(0, len(points))
+    return order, nodes
+
+
+def build_comps_index(df, features=None):
+    """KD-tree comps index over the rows of ``df``; ``features`` defaults to the CES space."""
+    features = tuple(features or COMPS_FEATURES)
+    scales = [
+        1.0 if col.startswith('norm_') else max(float(_numeric_column(df, col).max()), 1.0) for col in features
+    ]
+    points = comps_matrix(df, features, scales)
+    order, nodes = build_kd_tree(points)
+    return {
+        'features': features,
+        'scales': scales,
+        'basis': get_ces_basis(df),
+        'points': points,
+        'labels': df.index.to_numpy(),
+        'order': order,
+        'nodes': nodes,
+        'tombstones': set(),
+        'buffer': {},
+    }
+
+
+def update_comps_index(index, df, labels):
+    """Return a comps index reflecting edits to row ``labels`` of ``df``; ``index`` itself is left untouched."""
+    pending = len(index['buffer']) + len(index['tombstones']) + len(labels)
+    if get_ces_basis(df) != index['basis'] or pending > max(COMPS_LEAF_SIZE, COMPS_REBUILD_FRACTION * len(df)):
+        return build_comps_index(df, index['features'])
+
+    updated = {**index, 'tombstones': set(index['tombstones']), 'buffer': dict(index['buffer'])}
+    present = [label for label in labels if label in df.index]
+    vectors = comps_matrix(df.loc[present], index['features'], index['scales'])
+    for label in labels:
+        updated['tombstones'].add(label)
+        updated['buffer'].pop(label, None)
+    for label, vector in zip(present, vectors):
+        updated['buffer'][label] = vector
+    return updated
+
+
+def query_comps_index(index, point, k, exclude=()):
+    """Return up to ``k`` ``(distance, label)`` pairs nearest to ``point``, skipping ``exclude`` labels."""
+    points, order, nodes, labels = index['points'], index['order'], index['nodes'], index['labels']
+    exclude = set(exclude)
+    # Tombstones hide stale tree rows only; their current vectors live in the buffer.
+    skip = index['tombstones'] | exclude
+    best = []
+
+    def offer(distance, label):
+        if len(best) < k:
+            heapq.heappush(best, (-distance, label))
+        elif distance < -best[0][0]:
+            heapq.heapreplace(best, (-distance, label))
+
+    def visit(node_id):
+        start, end, dim, split, left, right = nodes[node_id]
+        if dim < 0:
+            positions = order[start:end]
+            distances = ((points[positions] - point) ** 2).sum(axis=1)
+            for position, distance in zip(positions, distances):
+                if labels[position] not in skip:
+                    offer(float(distance), labels[position])
+            return
+        diff = point[dim] - split
+        near, far = (left, right) if diff < 0 else (right, left)
+        visit(near)
+        if len(best) < k or diff * diff < -best[0][0]:
+            visit(far)
+
+    if k > 0:
+        if nodes:
+            visit(0)
+        for label, vector in index['buffer'].items():
+            if label not in exclude:
+                offer(float(((vector - point) ** 2).sum()), label)
+    return sorted((np.sqrt(-neg_distance), label) for neg_distance, label in best)
+
+
+def find_comps(index, df, player_index, player_names, k=5):
+    """Comparable contracts for each of ``player_names``: the ``k`` nearest other players' rows.
+
+    Returns one frame with ``comp_for`` and ``distance`` columns, ordered by player then distance.
+    """
+    frames = []
+    for name in player_names:
+        row = get_player_row(df, player_index, name)
+        if row is None:
+            continue
+        own_labels = [
+            label for player_id in player_index['name_ids'].get(name, []) for label in player_index['rows'].get(player_id, [])
+        ]
+        point = comps_matrix(df.loc[[row.name]], index['features'], index['scales'])[0]
+        matches = query_comps_index(index, point, k, exclude=own_labels)
+        if matches:
+            distances, match_labels = zip(*matches)
+            frames.append(df.loc[list(match_labels)].assign(comp_for=name, distance=list(distances)))
+    if not frames:
+        return df.iloc[0:0].assign(comp_for=pd.Series(dtype=object), distance=pd.Series(dtype='float64'))
+    return pd.concat(frames)
+
+
+def build_contract_snapshot(contract_df, version=0):
+    """Bundle contract records with their leaderboards, player index and salary model under one version."""
+    salary_model = build_salary_model(contract_df)
+    contract_df = with_salary_predictions(contract_df, salary_model)
+    return {
+        'version': version,
+        'records': contract_df,
+        'leaderboards': build_leaderboards(contract_df),
+        'player_index': build_player_index(contract_df),
+        'salary_model': salary_model,
+        'comps_index': build_comps_index(contract_df),
+    }
+
+
+def get_base_contract_snapshot(base_df):
+    """Initial contract snapshot shared by every session; edits always publish copies, never modify it."""
+    return get_cached_artifact(
+        ('contract_snapshot', base_df.attrs.get('data_version')),
+        lambda: build_contract_snapshot(calculate_contract_efficiency(base_df)),
+    )
+
+
+# Warm-up stages build every shared artifact in the background the first time the process
+# runs the script. Each stage lists the stages it needs; independent stages run in parallel
+# and pages pick up whatever is already warm through the usual cache lookups.
+WARMUP_STAGES = {
+    'dataset': ((), lambda: load_data()),
+    'salary_metrics': (('dataset',), lambda: ensure_salary_efficiency_columns(load_data())),
+    'contract_snapshot': (('dataset',), lambda: get_base_contract_snapshot(load_data())),
+    'player_index': (('dataset',), lambda: get_base_player_index(load_data())),
+    'leaderboards': (('dataset',), lambda: get_base_leaderboards(load_data())),
+    'rag_index': (('dataset',), lambda: get_base_rag_index(load_data())),
+    'salary_model': (('dataset',), lambda: get_base_salary_model(load_data())),
+    'summary_figures': (('leaderboards',), lambda: get_project_summary_artifacts(load_data())),
+}
+
+
+@st.cache_resource
+def get_warmup_status():
+    """Process-wide readiness of the warm-up stages."""
+    return {
+        'lock': threading.Lock(),
+        'stages': {name: 'pending' for name in WARMUP_STAGES},
+        'durations': {},
+        'errors': {},
+        'started': None,
+        'finished': None,
+    }
+
+
+def _run_warmup_stage(name):
+    started = time.perf_counter()
+    WARMUP_STAGES[name][1]()
+    return time.perf_counter() - started
+
+
+def run_warmup(status):
+    """Run every warm-up stage once its dependencies are ready; stages after a failure are skipped."""
+    stages = status['stages']
+    with ThreadPoolExecutor(max_workers=WARMUP_MAX_WORKERS, thread_name_prefix='warmup') as pool:
+        running = {}
+        while True:
+            for name, (dependencies, _) in WARMUP_STAGES.items():
+                if stages[name] == 'pending' and all(stages[dep] == 'ready' for dep in dependencies):
+                    stages[name] = 'running'
+                    running[pool.submit(_run_warmup_stage, name)] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    status['durations'][name] = future.result()
+                    stages[name] = 'ready'
+                except Exception as exc:
+                    status['errors'][name] = str(exc)
+                    stages[name] = 'failed'
+    for name, state in stages.items():
+        if state == 'pending':
+            stages[name] = 'skipped'
+    status['finished'] = time.time()
+
+
+def start_warmup():
+    """Start the warm-up thread once per process and return its status."""
+    status = get_warmup_status()
+    with status['lock']:
+        if status['started'] is None:
+            status['started'] = time.time()
+            threading.Thread(target=run_warmup, args=(status,), name='warmup', daemon=True).start()
+    return status
+
+
+def new_contract_store(base_df):
+    """Per-session store holding the latest published contract snapshot and queued edits."""
+    return {
+        'lock': threading.Lock(),
+        'snapshot': get_base_contract_snapshot(base_df),
+        'pending': [],
+        'invalidations': [],
+        'worker': None,
+        'error': None,
+    }
+
+
+def get_contract_store(base_df):
+    """Return the session's contract store, building the first snapshot on first use."""
+    if 'contract_store' not in st.session_state:
+        st.session_state.contract_store = new_contract_store(base_df)
+        if 'trade_store' in st.session_state:
+            invalidate_trade_evaluations(st.session_state.trade_store)
+            st.session_state.trade_store['contract_version'] = 0
+    return st.session_state.contract_store
+
+
+def sync_trade_store(trade_store, contract_store):
+    """Drop cached trade evaluations made stale by snapshots published since the last sync."""
+    with contract_store['lock']:
+        version = contract_store['snapshot']['version']
+        invalidations = [entry for entry in contract_store['invalidations'] if entry[0] > trade_store['contract_version']]
+        contract_store['invalidations'] = []
+    for _, teams, players in invalidations:
+        invalidate_trade_evaluations(trade_store, teams=teams, players=players)
+    trade_store['contract_version'] = version
+
+
+def get_contract_snapshot(base_df):
+    """Latest complete contract snapshot; edits still being recomputed are not visible yet."""
+    store = get_contract_store(base_df)
+    if 'trade_store' in st.session_state:
+        sync_trade_store(st.session_state.trade_store, store)
+    else:
+        with store['lock']:
+            store['invalidations'] = []
+    return store['snapshot']
+
+
+def get_contract_records(base_df):
+    """Return session-scoped contract data with CES columns applied."""
+    return get_contract_snapshot(base_df)['records']
+
+
+def apply_contract_mutations(snapshot, mutations):
+    """Apply queued edits to a copy of ``snapshot`` and recompute CES once for the whole batch.
+
+    Mutations are dicts with an ``op`` of ``create`` (``record``), ``update`` (``label`` and
+    ``values``) or ``delete`` (``label``). Creates for names that already exist and edits to rows
+    that are gone are skipped. Returns ``(new_snapshot, invalidation)`` where ``invalidation`` is
+    ``(version, teams, players)`` for :func:`sync_trade_store`, or ``(snapshot, None)`` when
+    nothing changed.
+    """
+    previous_df = snapshot['records']
+    previous_index = snapshot['player_index']
+    contract_df = previous_df.copy()
+    changes = {}
+    touched_labels = set()
+
+    for mutation in mutations:
+        if mutation['op'] == 'create':
+            name = mutation['record']['player_name']
+            if changes.get(name) is not None or any(
+                label in contract_df.index for label in _player_labels(previous_index, name)
+            ):
+                continue
+            new_record = {col: 0 for col in contract_df.columns}
+            if 'season' in contract_df.columns and contract_df['season'].notna().any():
+                new_record['season'] = max(contract_df['season'].dropna().unique().tolist())
+            new_record.update(mutation['record'])
+            max_id = int(contract_df['player_id'].max()) if len(contract_df) else 0
+            new_record['player_id'] = max(previous_index['max_id'], max_id) + 1
+            new_label = int(contract_df.index.max()) + 1 if len(contract_df) else 0
+            contract_df = pd.concat([contract_df, pd.DataFrame([new_record], index=[new_label])])
+            changes[name] = new_label
+            touched_labels.add(new_label)
+        elif mutation['label'] in contract_df.index:
+            label = mutation['label']
+            name = contract_df.at[label, 'player_name']
+            touched_labels.add(label)
+            if mutation['op'] == 'update':
+                contract_df.loc[label, list(mutation['values'])] = list(mutation['values'].values())
+                changes[name] = label
+            elif mutation['op'] == 'delete':
+                contract_df = contract_df.drop(index=label)
+                # The player stays on the boards and in the index while any of their rows remain.
+                changes.setdefault(name, None)
+                if changes[name] == label:
+                    changes[name] = None
+
+    if not changes:
+        return snapshot, None
+
+    contract_df = calculate_contract_efficiency(apply_contract_schema(contract_df))
+    salary_model = update_salary_model(
+        snapshot['salary_model'],
+        previous_df.loc[sorted(touched_labels & set(previous_df.index))],
+        contract_df.loc[sorted(touched_labels & set(contract_df.index))],
+    )
+    contract_df = with_salary_predictions(contract_df, salary_model)
+    # Content fingerprint for the derived-data cache; ``version`` only orders this session's snapshots.
+    contract_df.attrs['data_version'] = compute_data_version(contract_df)
+    version = snapshot['version'] + 1
+    new_snapshot = {
+        'version': version,
+        'records': contract_df,
+        'leaderboards': update_leaderboards(copy.deepcopy(snapshot['leaderboards']), contract_df, sorted(touched_labels)),
+        'player_index': update_player_index(copy.deepcopy(previous_index), contract_df, changes),
+        'salary_model': salary_model,
+        'comps_index': update_comps_index(snapshot['comps_index'], contract_df, sorted(touched_labels)),
+    }
+
+    if get_ces_basis(previous_df) != get_ces_basis(contract_df):
+        # Every team's CES moves when the normalization maxima move.
+        return new_snapshot, (version, None, None)
+    affected_teams = set(previous_df.loc[sorted(touched_labels & set(previous_df.index)), 'team_name'])
+    affected_teams |= set(contract_df.loc[sorted(touched_labels & set(contract_df.index)), 'team_name'])
+    for name in changes:
+        for frame, index in ((previous_df, previous_index), (contract_df, new_snapshot['player_index'])):
+            row = get_player_row(frame, index, name)
+            if row is not None:
+                affected_teams.add(row['team_name'])
+    return new_snapshot, (version, affected_teams, list(changes))
+
+
+def _contract_worker(store):
+    while True:
+        # Let rapid successive edits pile up so they share one recompute.
+        time.sleep(CONTRACT_COALESCE_SECONDS)
+        with store['lock']:
+            batch, store['pending'] = store['pending'], []
+            if not batch:
+                store['worker'] = None
+                return
+            snapshot = store['snapshot']
+        try:
+            new_snapshot, invalidation = apply_contract_mutations(snapshot, batch)
+        except Exception as exc:
+            with store['lock']:
+                store['error'] = f"Could not apply contract edits: {exc}"
+            continue
+        with store['lock']:
+            store['snapshot'] = new_snapshot
+            if invalidation is not None:
+                store['invalidations'].append(invalidation)
+
+
+def submit_contract_mutation(store, mutation):
+    """Queue a contract edit for the session's background worker, starting it if idle."""
+    with store['lock']:
+        store['pending'].append(mutation)
+        store['error'] = None
+        if store['worker'] is None:
+            store['worker'] = threading.Thread(target=_contract_worker, args=(store,), daemon=True)
+            store['worker'].start()
+
+
+def is_contract_store_busy(store):
+    return store['worker'] is not None
+
+
+def render_contract_status(store, seen_version):
+    """Show a recomputing notice while edits are queued and rerun the app once a new snapshot lands."""
+    if store['error']:
+        st.error(store['error'])
+    if is_contract_store_busy(store):
+        st.info("⏳ Recomputing contract efficiency… the tables below show the last complete snapshot.")
+    elif store['snapshot']['version'] != seen_version:
+        st.rerun()
+
+
+def simulate_ces_for_salary(player_name, new_salary, current_df, player_index):
+    """Simulate a CES and value label for a player after changing their salary."""
+    player_row = get_player_row(current_df, player_index, player_name)
+    if player_row is None:
+        return None
+
+    work_df = current_df.copy()
+    work_df.at[player_row.name, 'salary_usd'] = new_salary
+    recalculated_df = calculate_contract_efficiency(work_df)
+    return recalculated_df.loc[player_row.name]
+
+
+def tier_break_even_ces(scores, quantile):
+    """CES each player needs to reach the ``quantile`` cutoff, given that their own score moves it.
+
+    With linear interpolation over ``n`` scores the cutoff sits between ranks ``floor(h)`` and
+    ``floor(h) + 1`` where ``h = quantile * (n - 1)``, so a player clears it exactly when their
+    score reaches the ``ceil(h)``-th smallest of the *other* players' scores. Sorting once gives
+    that value for everyone.
+    """
+    scores = np.asarray(scores, dtype='float64')
+    order = np.argsort(scores, kind='stable')
+    ordered = scores[order]
+    ranks = np.empty(len(scores), dtype=int)
+    ranks[order] = np.arange(len(scores))
+    target = int(np.ceil(quantile * (len(scores) - 1))) - 1
+    if target < 0:
+        return np.full(len(scores), -np.inf)
+    # Skip over the player's own slot when counting into the others' sorted scores.
+    return ordered[target + (ranks <= target)]
+
+
+def solve_fair_salaries(contract_df):
+    """Highest salary at which every player still rates Fair, and still rates Underpaid.
+
+    Salary only enters CES through the player's own score, which falls as salary rises, so each
+    tier boundary is one salary: production divided by the break-even CES.
+    """
+    scores = _numeric_column(contract_df, 'contract_efficiency_score').to_numpy(dtype='float64')
+    performance = sum(
+        _numeric_column(contract_df, f'norm_{col}').to_numpy(dtype='float64') * weight
+        for col, weight in CES_WEIGHTS.items()
+    )
+
+    def salary_at(break_even):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            salary = performance / break_even * 1_000_000
+        return np.where((performance > 0) & (break_even > 0), salary, np.nan)
+
+    lower_quantile, upper_quantile = VALUE_TIER_QUANTILES
+    fair_ceiling = salary_at(tier_break_even_ces(scores, lower_quantile))
+    underpaid_ceiling = salary_at(tier_break_even_ces(scores, upper_quantile))
+    salary = _numeric_column(contract_df, 'salary_usd').to_numpy(dtype='float64')
+    return pd.DataFrame({
+        'player_name': contract_df['player_name'].to_numpy(),
+        'team_name': contract_df['team_name'].to_numpy(),
+        'salary_usd': salary,
+        'contract_efficiency_score': scores,
+        'contract_value_label': contract_df['contract_value_label'].to_numpy(),
+        'fair_salary_ceiling': fair_ceiling,
+        'underpaid_salary_ceiling': underpaid_ceiling,
+        'change_to_fair': np.minimum(fair_ceiling - salary, 0.0),
+    }, index=contract_df.index)
+
+
+def render_contract_editor(contract_store, contract_df, contract_player_index):
+    """What-if slider and update/delete form; runs as a fragment so dragging the slider reruns only this panel."""
+    flash = st.session_state.pop('ces_editor_flash', None)
+    if flash:
+        st.success(flash)
+
+    selected_player = st.selectbox("Select Player", contract_df['player_name'].tolist())
+    selected_row = get_player_row(contract_df, contract_player_index, selected_player)
+
+    new_salary_slider = st.slider(
+        "Simulate Salary (What-if)",
+        min_value=0.0,
+        max_value=float(max(contract_df['salary_usd'].max(), selected_row['salary_usd'])),
+        value=float(selected_row['salary_usd']),
+        step=250000.0,
+        help="Adjust to see updated CES without committing changes",
+    )
+
+    st.caption(f"Model-predicted salary: ${selected_row['predicted_salary']:,.0f}")
+    fair_row = cached_call(solve_fair_salaries, contract_df).loc[selected_row.name]
+    if pd.notna(fair_row['fair_salary_ceiling']):
+        st.caption(
+            f"Rates Fair or better up to ${fair_row['fair_salary_ceiling']:,.0f}"
+            f" and Underpaid up to ${fair_row['underpaid_salary_ceiling']:,.0f}"
+        )
+
+    simulated_row = simulate_ces_for_salary(selected_player, new_salary_slider, contract_df, contract_player_index)
+    if simulated_row is not None:
+        st.info(
+            f"Simulated CES: {simulated_row['contract_efficiency_score']:.2f} ({simulated_row['contract_value_label']})"
+        )
+
+    with st.form("update_contract_form"):
+        upd_salary = st.number_input("Salary (USD)", value=float(selected_row['salary_usd']), step=250000.0)
+        upd_pts = st.number_input("Points per Game", value=float(selected_row['pts']), step=0.1)
+        upd_reb = st.number_input("Rebounds per Game", value=float(selected_row['reb']), step=0.1)
+        upd_ast = st.number_input("Assists per Game", value=float(selected_row['assists']), step=0.1)
+        upd_years = st.number_input(
+            "Contract Years Remaining", min_value=0, max_value=10, value=int(selected_row['contract_years']), step=1
+        )
+        upd_raise = st.number_input(
+            "Annual Raise (%)", min_value=0.0, max_value=15.0, value=float(selected_row['annual_raise']) * 100, step=0.5
+        )
+        update_btn, delete_btn = st.columns(2)
+        with update_btn:
+            submitted_update = st.form_submit_button("Update", use_container_width=True)
+        with delete_btn:
+            submitted_delete = st.form_submit_button("Delete", use_container_width=True)
+
+    if submitted_update:
+        submit_contract_mutation(contract_store, {
+            'op': 'update',
+            'label': selected_row.name,
+            'values': {
+                'salary_usd': upd_salary,
+                'pts': upd_pts,
+                'reb': upd_reb,
+                'assists': upd_ast,
+                'contract_years': upd_years,
+                'annual_raise': upd_raise / 100,
+            },
+        })
+        st.session_state.ces_editor_flash = f"Updated {selected_player}; CES is recalculating."
+        st.rerun()
+
+    if submitted_delete:
+        submit_contract_mutation(contract_store, {'op': 'delete', 'label': selected_row.name})
+        st.session_state.ces_editor_flash = f"Deleted {selected_player}; the leaderboard is refreshing."
+        st.rerun()
+
+
+def render_comps_panel(snapshot):
+    """Comps lookup for one player or a whole roster; runs as a fragment so changing it skips the rest of the page."""
+    contract_df = snapshot['records']
+    comps_col1, comps_col2, comps_col3 = st.columns([2, 1, 2])
+    with comps_col1:
+        comps_mode = st.radio("Find comps for", ["Player", "Team roster"], horizontal=True, key="comps_mode")
+        if comps_mode == "Player":
+            comps_targets = [st.selectbox("Player", contract_df['player_name'].tolist(), key="comps_player")]
+        else:
+            comps_team = st.selectbox(
+                "Team", sorted(contract_df['team_name'].dropna().unique().tolist()), key="comps_team"
+            )
+            comps_targets = get_team_players(contract_df, comps_team)
+    with comps_col2:
+        comps_k = st.slider("Comps per player", 1, 10, 5, key="comps_k")
+    with comps_col3:
+        extra_features = st.multiselect(
+            "Also match on",
+            list(COMPS_EXTRA_FEATURES),
+            format_func=COMPS_EXTRA_FEATURES.get,
+            key="comps_extra",
+        )
+
+    if extra_features:
+        comps_index = cached_call(build_comps_index, contract_df, tuple(COMPS_FEATURES + extra_features))
+    else:
+        comps_index = snapshot['comps_index']
+    comps_df = find_comps(comps_index, contract_df, snapshot['player_index'], comps_targets, k=comps_k)
+    if comps_df.empty:
+        st.info("No comparable contracts found.")
+        return
+
+    if comps_mode == "Player":
+        comps_metric1, comps_metric2 = st.columns(2)
+        with comps_metric1:
+            st.metric("Median Comp Salary", f"${comps_df['salary_usd'].median():,.0f}")
+        with comps_metric2:
+            target_row = get_player_row(contract_df, snapshot['player_index'], comps_targets[0])
+            st.metric("Current Salary", f"${target_row['salary_usd']:,.0f}")
+
+    comps_view = comps_df[
+        ['comp_for', 'player_name', 'team_name', 'salary_usd', 'predicted_salary', 'pts', 'reb', 'assists', 'distance']
+    ]
+    comps_view.columns = ['Comp For', 'Player', 'Team', 'Salary (USD)', 'Predicted Salary (USD)', 'PTS', 'REB', 'AST', 'Distance']
+    st.dataframe(
+        comps_view if comps_mode == "Team roster" else comps_view.drop(columns=['Comp For']),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Salary (USD)": st.column_config.NumberColumn(format="$%,d"),
+            "Predicted Salary (USD)": st.column_config.NumberColumn(format="$%,d"),
+            "Distance": st.column_config.NumberColumn(format="%.3f"),
+        },
+    )
+
+
+def format_player_metric(player_data, key, fmt="{:.1f}", default="N/A"):
+    """Format a player's metric safely, returning a friendly fallback when missing."""
+    if key in player_data.index and pd.notnull(player_data[key]):
+        try:
+            return fmt.format(player_data[key])
+        except Exception:
+            pass
+    return default
+
+
+def get_numeric_stat(player_data, key, default=0):
+    """Safely fetch a numeric stat for visualizations without raising KeyError."""
+    try:
+        value = player_data.get(key, default)
+        if pd.notnull(value):
+            return value
+    except Exception:
+        pass
+    return default
+
+
+def build_team_totals(contract_df):
+    """Per-team salary and CES totals."""
+    return contract_df.groupby('team_name', observed=True)[['salary_usd', 'contract_efficiency_score']].sum()
+
+
+def build_team_rosters(contract_df):
+    """Sorted player names for every team."""
+    rosters = {}
+    for team, name in zip(contract_df['team_name'], contract_df['player_name']):
+        rosters.setdefault(team, []).append(name)
+    return {team: sorted(names) for team, names in rosters.items()}
+
+
+def get_team_total(contract_df, team_name, column):
+    totals = cached_call(build_team_totals, contract_df)
+    return totals.at[team_name, column] if team_name in totals.index else 0.0
+
+
+def get_cap_rules(season=None):
+    """Cap rules for ``season``, falling back to the default season's table."""
+    return CAP_RULES.get(season, CAP_RULES[DEFAULT_CAP_SEASON])
+
+
+def cap_rules_for(contract_df):
+    """Cap rules for the latest season in the contract data."""
+    return get_cap_rules(projection_season_labels(contract_df, 1)[0])
+
+
+def evaluate_cap_rules(payroll, rules, repeater=False, growth=1.0):
+    """Cap space, tiered luxury tax bill and apron flags for an array of payrolls.
+
+    ``repeater`` and ``growth`` (a multiplier on every threshold, for future seasons) broadcast
+    against ``payroll``, so one call covers every team, season or candidate trade.
+    """
+    payroll = np.asarray(payroll, dtype='float64')
+    growth = np.asarray(growth, dtype='float64')
+    cap = rules['salary_cap'] * growth
+    tax_line = rules['tax_line'] * growth
+    bracket = rules['tax_bracket'] * growth
+
+    # Dollars over the tax line in each bracket: a payroll × bracket matrix times the rate ladder.
+    brackets_over = np.maximum(payroll - tax_line, 0.0) / bracket
+    bracket_count = len(rules['tax_rates'])
+    if brackets_over.size:
+        bracket_count = max(bracket_count, int(np.ceil(brackets_over.max())))
+    portions = np.clip(brackets_over[..., None] - np.arange(bracket_count), 0.0, 1.0) * bracket[..., None]
+
+    def rate_ladder(rates):
+        steps = rules['tax_rate_step'] * np.arange(1, bracket_count - len(rates) + 1)
+        return np.concatenate([rates, rates[-1] + steps])
+
+    tax_bill = np.where(
+        repeater, portions @ rate_ladder(rules['repeater_rates']), portions @ rate_ladder(rules['tax_rates'])
+    )
+    over_cap = payroll > cap
+    over_tax = payroll > tax_line
+    first_apron = payroll > rules['first_apron'] * growth
+    second_apron = payroll > rules['second_apron'] * growth
+    return {
+        'payroll': payroll,
+        'cap_space': cap - payroll,
+        'tax_bill': tax_bill,
+        'over_cap': over_cap,
+        'over_tax': over_tax,
+        'first_apron': first_apron,
+        'second_apron': second_apron,
+        'repeater': np.broadcast_to(repeater, payroll.shape),
+        'status': np.select(
+            [second_apron, first_apron, over_tax, over_cap], CAP_STATUS_LABELS[:-1], CAP_STATUS_LABELS[-1]
+        ),
+    }
+
+
+def salary_matching_limit(outgoing, rules):
+    """Most salary an over-the-cap team may take back for ``outgoing`` salary (vectorized)."""
+    outgoing = np.asarray(outgoing, dtype='float64')
+    bands = rules['matching_bands']
+    return np.select(
+        [outgoing <= upper for upper, _, _ in bands],
+        [ratio * outgoing + cushion for _, ratio, cushion in bands],
+    )
+
+
+def build_team_cap_table(contract_df):
+    """Payroll, cap space, tax bill and apron flags for every team under the season's cap rules."""
+    rules = cap_rules_for(contract_df)
+    payroll = cached_call(build_team_totals, contract_df)['salary_usd']
+    teams = payroll.index.astype(str)
+    position = evaluate_cap_rules(payroll.to_numpy(), rules, teams.isin(rules['repeater_teams']))
+    columns = ['payroll', 'cap_space', 'tax_bill', 'status', 'repeater', 'first_apron', 'second_apron']
+    return pd.DataFrame({column: position[column] for column in columns}, index=teams)
+
+
+def build_player_totals(contract_df):
+    """Salary and CES by ``(team, player)``."""
+    index = pd.MultiIndex.from_arrays(
+        [contract_df['team_name'].astype(str), contract_df['player_name'].astype(str)]
+    )
+    values = contract_df[['salary_usd', 'contract_efficiency_score']].astype('float64').set_axis(index)
+    return values.groupby(level=[0, 1]).sum()
+
+
+def evaluate_trade_batch(trades, contract_df):
+    """Cap outcome and salary-matching legality for many candidate trades in one pass.
+
+    ``trades`` is a list of ``(team_a, team_b, outgoing_a, outgoing_b)``. Returns one row per
+    trade side (``trade``, ``side``) with payroll, tax bill and team CES before and after, apron
+    flags and whether the side's incoming salary is legal under the season's matching rules.
+    """
+    rules = cap_rules_for(contract_df)
+    sides = pd.DataFrame(
+        [
+            (trade, side, team)
+            for trade, (team_a, team_b, _, _) in enumerate(trades)
+            for side, team in (('team_a', team_a), ('team_b', team_b))
+        ],
+        columns=['trade', 'side', 'team'],
+    )
+    sent = pd.DataFrame(
+        [
+            (trade, side, team, player)
+            for trade, (team_a, team_b, outgoing_a, outgoing_b) in enumerate(trades)
+            for side, team, players in (('team_a', team_a, outgoing_a), ('team_b', team_b, outgoing_b))
+            for player in players
+        ],
+        columns=['trade', 'side', 'team', 'player'],
+    )
+    player_totals = cached_call(build_player_totals, contract_df)
+    sent_values = player_totals.reindex(pd.MultiIndex.from_frame(sent[['team', 'player']].astype(str)))
+    sent['salary'] = sent_values['salary_usd'].to_numpy()
+    sent['ces'] = sent_values['contract_efficiency_score'].to_numpy()
+    sent_totals = sent.groupby(['trade', 'side']).agg(
+        sum=('salary', 'sum'), count=('salary', 'count'), ces=('ces', 'sum')
+    )
+    sent_totals = sent_totals.reindex(pd.MultiIndex.from_frame(sides[['trade', 'side']]), fill_value=0)
+
+    outgoing = sent_totals['sum'].to_numpy(dtype='float64')
+    outgoing_count = sent_totals['count'].to_numpy()
+    outgoing_ces = sent_totals['ces'].to_numpy(dtype='float64')
+    # Sides alternate a, b per trade, so each side's incoming salary and CES are its partner's outgoing.
+    incoming = outgoing.reshape(-1, 2)[:, ::-1].ravel()
+    incoming_ces = outgoing_ces.reshape(-1, 2)[:, ::-1].ravel()
+    team_totals = cached_call(build_team_totals, contract_df)
+    team_keys = team_totals.index.astype(str)
+    payroll = dict(zip(team_keys, team_totals['salary_usd']))
+    team_ces = dict(zip(team_keys, team_totals['contract_efficiency_score']))
+    salary_pre = sides['team'].map(payroll).fillna(0.0).to_numpy(dtype='float64')
+    salary_post = salary_pre - outgoing + incoming
+    ces_pre = sides['team'].map(team_ces).fillna(0.0).to_numpy(dtype='float64')
+    repeater = sides['team'].isin(rules['repeater_teams']).to_numpy()
+
+    before = evaluate_cap_rules(salary_pre, rules, repeater)
+    after = evaluate_cap_rules(salary_post, rules, repeater)
+    matching_limit = salary_matching_limit(outgoing, rules)
+    salary_matched = ~after['over_cap'] | (incoming <= matching_limit)
+    apron_matched = ~after['first_apron'] | (incoming <= outgoing * rules['first_apron_matching'])
+    aggregation_allowed = ~after['second_apron'] | (outgoing_count <= 1)
+    return sides.assign(
+        outgoing=outgoing,
+        outgoing_count=outgoing_count,
+        incoming=incoming,
+        salary_pre=salary_pre,
+        salary_post=salary_post,
+        cap_space_pre=before['cap_space'],
+        cap_space_post=after['cap_space'],
+        tax_bill_pre=before['tax_bill'],
+        tax_bill_post=after['tax_bill'],
+        ces_pre=ces_pre,
+        ces_post=ces_pre - outgoing_ces + incoming_ces,
+        status=after['status'],
+        repeater=repeater,
+        first_apron=after['first_apron'],
+        second_apron=after['second_apron'],
+        matching_limit=matching_limit,
+        salary_matched=salary_matched,
+        apron_matched=apron_matched,
+        aggregation_allowed=aggregation_allowed,
+        legal=salary_matched & apron_matched & aggregation_allowed,
     )
 
-    if 'dollars_per_game' in df.columns:
-        df['dollars_per_game'] = pd.to_numeric(df['dollars_per_game'], errors='coerce')
-    base_games = df['gp'].replace({0: pd.NA}) if 'gp' in df.columns else pd.NA
-    df['dollars_per_game'] = df.get('dollars_per_game', pd.NA).combine_first(
-        df.get('salary_usd', pd.NA) / base_games
-    )
 
-    df['dollars_per_point'] = df['dollars_per_point'].fillna(0)
-    df['dollars_per_game'] = df['dollars_per_game'].fillna(0)
+def compute_team_financials(contract_df, team_name):
+    """Return salary, cap space, and luxury tax bill for a team."""
+    cap_table = cached_call(build_team_cap_table, contract_df)
+    if team_name not in cap_table.index:
+        return 0.0, cap_rules_for(contract_df)['salary_cap'], 0.0
+    row = cap_table.loc[team_name]
+    return row['payroll'], row['cap_space'], row['tax_bill']
+
+
+def get_team_players(contract_df, team_name):
+    return list(cached_call(build_team_rosters, contract_df).get(team_name, []))
+
+
+def evaluate_trades(trades, contract_df):
+    """Evaluate many two-team trades and return one result per trade with cap impact and validation flags.
+
+    ``trades`` is a list of ``(team_a, team_b, outgoing_a, outgoing_b)``. Every trade goes through
+    one :func:`evaluate_trade_batch` call; ``luxury_pre``/``luxury_post`` are tiered tax bills
+    and violations are breaches of the season's salary-matching and apron rules.
+    """
+    rosters = cached_call(build_team_rosters, contract_df)
+    roster_sets = {}
+    rules = cap_rules_for(contract_df)
+    sides = evaluate_trade_batch(trades, contract_df).to_dict('records')
+    results = []
+    for trade, (team_a, team_b, outgoing_a, outgoing_b) in enumerate(trades):
+        errors = []
+        if not team_a or not team_b:
+            errors.append("Select two teams to evaluate a trade.")
+        if team_a and team_b and team_a == team_b:
+            errors.append("Teams must be different for a trade.")
+        for team, outgoing in ((team_a, outgoing_a), (team_b, outgoing_b)):
+            if not team:
+                continue
+            if team not in roster_sets:
+                roster_sets[team] = set(rosters.get(team, []))
+            invalid = [player for player in outgoing if player not in roster_sets[team]]
+            if invalid:
+                errors.append(f"Invalid selections for {team}: {', '.join(invalid)}")
+
+        team_results = {}
+        violations = []
+        for row in sides[2 * trade:2 * trade + 2]:
+            team = team_a if row['side'] == 'team_a' else team_b
+            team_results[row['side']] = {
+                'team': team,
+                'salary_pre': float(row['salary_pre']),
+                'salary_post': float(row['salary_post']),
+                'cap_space_pre': float(row['cap_space_pre']),
+                'cap_space_post': float(row['cap_space_post']),
+                'luxury_pre': float(row['tax_bill_pre']),
+                'luxury_post': float(row['tax_bill_post']),
+                'salary_delta': float(row['salary_post'] - row['salary_pre']),
+                'ces_pre': float(row['ces_pre']),
+                'ces_post': float(row['ces_post']),
+                'ces_delta': float(row['ces_post'] - row['ces_pre']),
+                'status': row['status'],
+                'repeater': bool(row['repeater']),
+                'first_apron': bool(row['first_apron']),
+                'second_apron': bool(row['second_apron']),
+                'matching_limit': float(row['matching_limit']),
+            }
+            if not team:
+                continue
+            if not row['salary_matched']:
+                violations.append(
+                    f"{team} takes back ${row['incoming']:,.0f} for ${row['outgoing']:,.0f} outgoing; "
+                    f"salary matching allows ${row['matching_limit']:,.0f}."
+                )
+            if not row['apron_matched']:
+                violations.append(
+                    f"{team} would be above the first apron and may take back at most "
+                    f"{rules['first_apron_matching']:.0%} of outgoing salary."
+                )
+            if not row['aggregation_allowed']:
+                violations.append(f"{team} would be above the second apron and cannot aggregate salaries.")
+
+        results.append({
+            'errors': errors,
+            'team_results': team_results,
+            'violations': violations,
+            'outgoing_a_salary': float(sides[2 * trade]['outgoing']),
+            'outgoing_b_salary': float(sides[2 * trade + 1]['outgoing']),
+        })
+    return results
+
+
+def evaluate_trade(team_a, team_b, outgoing_a, outgoing_b, contract_df):
+    """Evaluate a single two-team trade; see :func:`evaluate_trades`."""
+    return evaluate_trades([(team_a, team_b, outgoing_a, outgoing_b)], contract_df)[0]
+
+
+def projection_season_labels(contract_df, seasons):
+    """Season labels starting at the latest season in the data, e.g. ``2024-25``, ``2025-26``, ..."""
+    known = contract_df['season'].dropna().unique().tolist() if 'season' in contract_df.columns else []
+    match = re.match(r'(\d{4})', str(max(known))) if known else None
+    if match is None:
+        return [f"Year {offset + 1}" for offset in range(seasons)]
+    start = int(match.group(1))
+    return [f"{year}-{(year + 1) % 100:02d}" for year in range(start, start + seasons)]
+
+
+def salary_schedule(contract_df, seasons):
+    """Rows × seasons matrix of each contract's salary, raised annually and zero once it expires."""
+    offsets = np.arange(seasons)
+    salary = _numeric_column(contract_df, 'salary_usd').to_numpy(dtype='float64')
+    raises = _numeric_column(contract_df, 'annual_raise').to_numpy(dtype='float64')
+    years = _numeric_column(contract_df, 'contract_years').to_numpy(dtype='float64')
+    return salary[:, None] * (1 + raises[:, None]) ** offsets * (offsets < years[:, None])
+
+
+def project_payroll(schedule, team_codes, team_count, seasons, cap_growth, rules, repeater=False):
+    """Aggregate a salary schedule into teams × seasons payroll, cap space and tax arrays."""
+    payroll = np.zeros((team_count, seasons))
+    valid = team_codes >= 0
+    np.add.at(payroll, team_codes[valid], schedule[valid])
+    growth = (1 + cap_growth) ** np.arange(seasons)
+    tax_line = rules['tax_line'] * growth
+    position = evaluate_cap_rules(payroll, rules, repeater, growth)
+    return {
+        'payroll': payroll,
+        'cap': rules['salary_cap'] * growth,
+        'tax_line': tax_line,
+        'cap_space': position['cap_space'],
+        'tax_exposure': np.maximum(payroll - tax_line, 0.0),
+        'tax_bill': position['tax_bill'],
+        'status': position['status'],
+    }
+
+
+def _team_codes(contract_df):
+    teams = contract_df['team_name'].astype('category')
+    return teams.cat.codes.to_numpy(), list(teams.cat.categories)
+
+
+def project_team_payrolls(contract_df, seasons=PROJECTION_SEASONS, cap_growth=DEFAULT_CAP_GROWTH):
+    """Payroll, cap space and tax exposure for every team over the next ``seasons`` seasons."""
+    codes, teams = _team_codes(contract_df)
+    rules = cap_rules_for(contract_df)
+    repeater = np.isin(teams, rules['repeater_teams'])[:, None]
+    projection = project_payroll(
+        salary_schedule(contract_df, seasons), codes, len(teams), seasons, cap_growth, rules, repeater
+    )
+    return {**projection, 'teams': teams, 'seasons': projection_season_labels(contract_df, seasons)}
+
+
+def project_trade(team_a, team_b, outgoing_a, outgoing_b, contract_df, seasons=PROJECTION_SEASONS, cap_growth=DEFAULT_CAP_GROWTH):
+    """Multi-year payroll for both trade partners before and after the players swap teams.
+
+    Returns a long frame with one row per team and season.
+    """
+    codes, teams = _team_codes(contract_df)
+    if team_a not in teams or team_b not in teams:
+        return pd.DataFrame()
+    code_a, code_b = teams.index(team_a), teams.index(team_b)
+    names = contract_df['player_name']
+    moved_codes = codes.copy()
+    moved_codes[((codes == code_a) & names.isin(outgoing_a)).to_numpy()] = code_b
+    moved_codes[((codes == code_b) & names.isin(outgoing_b)).to_numpy()] = code_a
+
+    schedule = salary_schedule(contract_df, seasons)
+    rules = cap_rules_for(contract_df)
+    repeater = np.isin(teams, rules['repeater_teams'])[:, None]
+    before = project_payroll(schedule, codes, len(teams), seasons, cap_growth, rules, repeater)
+    after = project_payroll(schedule, moved_codes, len(teams), seasons, cap_growth, rules, repeater)
+    season_labels = projection_season_labels(contract_df, seasons)
+    rows = []
+    for team, code in [(team_a, code_a), (team_b, code_b)]:
+        for offset, season in enumerate(season_labels):
+            rows.append({
+                'team': team,
+                'season': season,
+                'payroll_before': before['payroll'][code, offset],
+                'payroll_after': after['payroll'][code, offset],
+                'cap': after['cap'][offset],
+                'tax_line': after['tax_line'][offset],
+                'cap_space_after': after['cap_space'][code, offset],
+                'tax_exposure_after': after['tax_exposure'][code, offset],
+                'tax_bill_after': after['tax_bill'][code, offset],
+            })
+    return pd.DataFrame(rows)
+
+
+def optimize_signings(salaries, values, budget, max_signings, step=OPTIMIZER_SALARY_STEP):
+    """0/1 knapsack over salary discretized to ``step`` dollars with a limit on the number of signings.
+
+    Salaries are rounded up so a plan never exceeds ``budget``. Returns the best set of indices
+    and the Pareto frontier of spend vs value: one ``(indices, spend, value)`` entry for every
+    budget level at which the best achievable value improves.
+    """
+    salaries = np.asarray(salaries, dtype='float64')
+    values = np.asarray(values, dtype='float64')
+    weights = np.maximum(np.ceil(salaries / step), 1).astype(int)
+    capacity = max(int(budget // step), 0)
+    # best[k, b]: highest value from exactly k signings costing at most b steps.
+    best = np.full((max_signings + 1, capacity + 1), -np.inf)
+    best[0] = 0.0
+    taken = np.zeros((len(weights), max_signings + 1, capacity + 1), dtype=bool)
+    for item, (weight, value) in enumerate(zip(weights, values)):
+        if weight > capacity or value <= 0 or max_signings == 0:
+            continue
+        candidate = best[:-1, :capacity + 1 - weight] + value
+        improved = candidate > best[1:, weight:]
+        best[1:, weight:][improved] = candidate[improved]
+        taken[item, 1:, weight:] = improved
+
+    def backtrack(signings, budget_steps):
+        chosen = []
+        for item in range(len(weights) - 1, -1, -1):
+            if signings and taken[item, signings, budget_steps]:
+                chosen.append(item)
+                signings -= 1
+                budget_steps -= weights[item]
+        return chosen[::-1]
+
+    frontier = []
+    value_by_budget = best.max(axis=0)
+    previous = -np.inf
+    for budget_steps in range(capacity + 1):
+        if value_by_budget[budget_steps] > previous + 1e-9:
+            previous = value_by_budget[budget_steps]
+            chosen = backtrack(int(best[:, budget_steps].argmax()), budget_steps)
+            frontier.append((chosen, float(salaries[chosen].sum()), float(values[chosen].sum())))
+    return frontier[-1][0], frontier
+
+
+def plan_team_signings(contract_df, team_name, objective, budget_line, open_spots, asking_column):
+    """Best signings for ``team_name`` from every other team's players, kept under a cap-rules line.
+
+    Returns the chosen players, the frontier of spend vs value, and the payroll and budget used.
+    """
+    payroll, _, _ = compute_team_financials(contract_df, team_name)
+    budget = cap_rules_for(contract_df)[budget_line] - payroll
+    pool = contract_df[contract_df['team_name'] != team_name]
+    if objective == 'production':
+        values = _numeric_column(pool, 'pts') + _numeric_column(pool, 'reb') + _numeric_column(pool, 'assists')
+    else:
+        values = _numeric_column(pool, objective)
+    asking = _numeric_column(pool, asking_column).clip(lower=0)
+    chosen, frontier = optimize_signings(asking.to_numpy(), values.to_numpy(), budget, open_spots)
+    columns = ['player_name', 'team_name', asking_column, 'contract_efficiency_score', 'pts', 'reb', 'assists']
+    signings = pool.iloc[chosen][columns]
+    frontier_df = pd.DataFrame(
+        [
+            {'spend': spend, 'value': value, 'signings': len(indices),
+             'players': ', '.join(pool['player_name'].iloc[indices].astype(str))}
+            for indices, spend, value in frontier
+        ]
+    )
+    return {'signings': signings, 'frontier': frontier_df, 'payroll': payroll, 'budget': budget}
+
+
+def new_trade_store():
+    """Empty trade proposal store with id, team, and player indexes plus cached evaluations."""
+    return {
+        'records': {},
+        'labels': {},
+        'by_team': {},
+        'by_player': {},
+        'evaluations': {},
+        'summary': None,
+        'next_id': 1,
+        'contract_version': 0,
+    }
+
+
+def _trade_label(record):
+    return f"{record['title']} — {record['team_a']} ↔ {record['team_b']}"
+
+
+def _index_trade(store, record):
+    trade_id = record['id']
+    store['labels'][trade_id] = _trade_label(record)
+    for team in (record['team_a'], record['team_b']):
+        store['by_team'].setdefault(team, set()).add(trade_id)
+    for player in record['outgoing_a'] + record['outgoing_b']:
+        store['by_player'].setdefault(player, set()).add(trade_id)
+
+
+def _unindex_trade(store, record):
+    trade_id = record['id']
+    store['labels'].pop(trade_id, None)
+    for team in (record['team_a'], record['team_b']):
+        store['by_team'].get(team, set()).discard(trade_id)
+    for player in record['outgoing_a'] + record['outgoing_b']:
+        store['by_player'].get(player, set()).discard(trade_id)
+    store['evaluations'].pop(trade_id, None)
+    store['summary'] = None
+
+
+def add_trade_proposal(store, title, team_a, team_b, outgoing_a, outgoing_b):
+    """Store a new proposal and return its record."""
+    trade_id = store['next_id']
+    record = {
+        'id': trade_id,
+        'title': title or f"Trade {trade_id}",
+        'team_a': team_a,
+        'team_b': team_b,
+        'outgoing_a': tuple(outgoing_a),
+        'outgoing_b': tuple(outgoing_b),
+    }
+    store['records'][trade_id] = record
+    store['next_id'] += 1
+    _index_trade(store, record)
+    store['summary'] = None
+    return record
+
+
+def update_trade_proposal(store, trade_id, **fields):
+    """Replace fields on a stored proposal, re-indexing it and dropping its cached evaluation."""
+    record = store['records'][trade_id]
+    _unindex_trade(store, record)
+    for key in ('outgoing_a', 'outgoing_b'):
+        if key in fields:
+            fields[key] = tuple(fields[key])
+    record.update(fields)
+    _index_trade(store, record)
+    return record
+
+
+def delete_trade_proposal(store, trade_id):
+    record = store['records'].pop(trade_id, None)
+    if record is not None:
+        _unindex_trade(store, record)
+
+
+def invalidate_trade_evaluations(store, teams=None, players=None):
+    """Drop cached evaluations for proposals touching ``teams`` or ``players``; ``None`` for both clears all."""
+    if teams is None and players is None:
+        affected = set(store['evaluations'])
+    else:
+        affected = set()
+        for team in teams or []:
+            affected |= store['by_team'].get(team, set())
+        for player in players or []:
+            affected |= store['by_player'].get(player, set())
+
+    for trade_id in affected:
+        store['evaluations'].pop(trade_id, None)
+    if affected:
+        store['summary'] = None
+
+
+def refresh_trade_evaluations(store, contract_df, trade_ids=None):
+    """Evaluate every stale proposal among ``trade_ids`` (default: all) in one batch."""
+    trade_ids = store['records'] if trade_ids is None else trade_ids
+    stale = [trade_id for trade_id in trade_ids if trade_id not in store['evaluations']]
+    if not stale:
+        return
+    records = [store['records'][trade_id] for trade_id in stale]
+    trades = [
+        (record['team_a'], record['team_b'], list(record['outgoing_a']), list(record['outgoing_b']))
+        for record in records
+    ]
+    store['evaluations'].update(zip(stale, evaluate_trades(trades, contract_df)))
+
+
+def evaluate_trade_proposal(store, trade_id, contract_df):
+    """Evaluate a stored proposal, reusing the cached result until one of its teams changes."""
+    refresh_trade_evaluations(store, contract_df, [trade_id])
+    return store['evaluations'][trade_id]
+
+
+def get_trade_summary(store, contract_df):
+    """Summary table of every proposal, rebuilt only after a proposal or one of its teams changes."""
+    if store['summary'] is None:
+        refresh_trade_evaluations(store, contract_df)
+        summary_rows = []
+        for trade_id, trade in store['records'].items():
+            result = store['evaluations'][trade_id]
+            summary_rows.append(
+                {
+                    'Trade': trade['title'],
+                    'Teams': f"{trade['team_a']} ↔ {trade['team_b']}",
+                    'Status': "; ".join(result['violations']) if result['violations'] else "Cap Compliant",
+                    'Team A Salary After': result['team_results']['team_a']['salary_post'],
+                    'Team B Salary After': result['team_results']['team_b']['salary_post'],
+                }
+            )
+        store['summary'] = pd.DataFrame(summary_rows)
+    return store['summary']
+
+
+def build_trade_export(store, contract_df):
+    """One row per proposal side with its cap-rules outcome, evaluated as a single batch."""
+    records = list(store['records'].values())
+    trades = [(record['team_a'], record['team_b'], record['outgoing_a'], record['outgoing_b']) for record in records]
+    evaluated = evaluate_trade_batch(trades, contract_df)
+    evaluated.insert(0, 'proposal', [records[trade]['title'] for trade in evaluated['trade']])
+    sent = {
+        (trade, side): ', '.join(record[f'outgoing_{side[-1]}'])
+        for trade, record in enumerate(records)
+        for side in ('team_a', 'team_b')
+    }
+    evaluated.insert(4, 'players_sent', [sent[key] for key in zip(evaluated['trade'], evaluated['side'])])
+    return evaluated.drop(columns='trade')
+
+
+def render_trade_builder(trade_store, contract_df, teams_list):
+    """New-trade form with live cap preview; runs as a fragment so editing it skips the saved proposals below."""
+    st.markdown("### Propose a New Trade")
+    proposal_title = st.text_input(
+        "Trade Name", value=f"Trade {trade_store['next_id']}", key="trade_title"
+    )
+
+    col_a, col_b = st.columns(2)
+    with col_a:
+        team_a = st.selectbox("Team A", teams_list, key="trade_team_a")
+        outgoing_a = st.multiselect(
+            "Players sent to Team B",
+            options=get_team_players(contract_df, team_a),
+            key="trade_out_a",
+        )
+
+    with col_b:
+        team_b = st.selectbox("Team B", teams_list, key="trade_team_b")
+        outgoing_b = st.multiselect(
+            "Players sent to Team A",
+            options=get_team_players(contract_df, team_b),
+            key="trade_out_b",
+        )
+
+    trade_preview = get_cached_artifact(
+        ('evaluate_trade', contract_df.attrs.get('data_version'), team_a, team_b, tuple(outgoing_a), tuple(outgoing_b)),
+        lambda: evaluate_trade(team_a, team_b, outgoing_a, outgoing_b, contract_df),
+    )
+
+    if trade_preview['errors']:
+        for err in trade_preview['errors']:
+            st.warning(f"⚠️ {err}")
+
+    if trade_preview['violations']:
+        for msg in trade_preview['violations']:
+            st.error(f"🚫 {msg}")
+
+    st.markdown("#### Cap & CES Impact Preview")
+    preview_col1, preview_col2 = st.columns(2)
+    for col, key in zip([preview_col1, preview_col2], ['team_a', 'team_b']):
+        team_result = trade_preview['team_results'].get(key)
+        if team_result and team_result['team']:
+            with col:
+                st.markdown(f"**{team_result['team']}** — {team_result['status']}")
+                st.metric(
+                    "Post-Trade Salary",
+                    f"${team_result['salary_post']:,.0f}",
+                    delta=f"${team_result['salary_delta']:,.0f}",
+                )
+                st.metric(
+                    "Cap Space After",
+                    f"${team_result['cap_space_post']:,.0f}",
+                    delta=f"${team_result['cap_space_post'] - team_result['cap_space_pre']:,.0f}",
+                )
+                st.metric(
+                    "Team CES",
+                    f"{team_result['ces_post']:.2f}",
+                    delta=f"{team_result['ces_delta']:.2f}",
+                )
+                st.caption(
+                    f"Luxury Tax Bill: ${team_result['luxury_post']:,.0f} | "
+                    f"Outgoing Salary: ${trade_preview['outgoing_a_salary' if key == 'team_a' else 'outgoing_b_salary']:,.0f}"
+                )
+                sent_players = outgoing_a if key == 'team_a' else outgoing_b
+                if sent_players:
+                    sent_rows = contract_df[
+                        (contract_df['team_name'] == team_result['team']) & contract_df['player_name'].isin(sent_players)
+                    ]
+                    st.caption(f"Predicted value of players sent: ${sent_rows['predicted_salary'].sum():,.0f}")
+
+    st.markdown("#### Multi-Year Outlook")
+    projection_seasons = st.session_state.get('projection_seasons', PROJECTION_SEASONS)
+    cap_growth = st.session_state.get('projection_cap_growth', DEFAULT_CAP_GROWTH * 100) / 100
+    trade_projection = project_trade(
+        team_a, team_b, outgoing_a, outgoing_b, contract_df, seasons=projection_seasons, cap_growth=cap_growth
+    )
+    if not trade_projection.empty:
+        projection_fig = go.Figure()
+        for team in (team_a, team_b):
+            team_rows = trade_projection[trade_projection['team'] == team]
+            team_color = get_team_colors(team)['primary']
+            projection_fig.add_trace(go.Scatter(
+                x=team_rows['season'], y=team_rows['payroll_before'], name=f"{team} before",
+                line=dict(color=team_color, dash='dot'),
+            ))
+            projection_fig.add_trace(go.Scatter(
+                x=team_rows['season'], y=team_rows['payroll_after'], name=f"{team} after",
+                line=dict(color=team_color),
+            ))
+        season_rows = trade_projection.drop_duplicates('season')
+        projection_fig.add_trace(go.Scatter(
+            x=season_rows['season'], y=season_rows['tax_line'], name="Luxury tax",
+            line=dict(color='#F44336', dash='dash'),
+        ))
+        projection_fig.add_trace(go.Scatter(
+            x=season_rows['season'], y=season_rows['cap'], name="Salary cap",
+            line=dict(color='#7f8c8d', dash='dash'),
+        ))
+        projection_fig.update_layout(height=350, yaxis_tickformat='$,.0f', margin=dict(t=30))
+        st.plotly_chart(projection_fig, use_container_width=True)
+        st.caption(
+            f"Committed salary with each contract's remaining years and annual raise; cap and tax lines grow {cap_growth:.0%} per season."
+        )
+
+    flash = st.session_state.pop('trade_builder_flash', None)
+    if flash:
+        st.success(flash)
+
+    if st.button("💾 Save Trade Proposal", type="primary"):
+        if trade_preview['errors']:
+            st.error("Cannot save trade with validation errors.")
+        else:
+            new_trade = add_trade_proposal(
+                trade_store, proposal_title.strip(), team_a, team_b, outgoing_a, outgoing_b
+            )
+            st.session_state.trade_builder_flash = f"Saved {new_trade['title']} with live cap validation."
+            st.rerun()
+
+
+def render_chat_message(msg, eager):
+    """Render one chat message. Only eager messages load their result and headshots up front."""
+    if msg['role'] == 'user':
+        st.markdown(f"""
+            <div class='chat-message user-message'>
+                <strong>You ({msg['timestamp']}):</strong><br>{msg['content']}
+            </div>
+        """, unsafe_allow_html=True)
+        return
+
+    st.markdown(f"""
+        <div class='chat-message assistant-message'>
+            <strong>Assistant ({msg['timestamp']}):</strong><br>{msg['content']}
+        </div>
+    """, unsafe_allow_html=True)
+    if not msg['result_rows']:
+        return
+    if msg['result'] is None and not msg['result_path']:
+        st.caption("Result table was evicted to save memory.")
+        return
+    if not (eager or st.toggle(f"Show result ({msg['result_rows']:,} rows)", key=f"chat_result_{msg['id']}")):
+        return
+
+    result_df = load_chat_result(msg)
+    if result_df is None:
+        st.caption("Result table is no longer available.")
+        return
+    st.dataframe(result_df, use_container_width=True)
+    render_export_buttons(
+        lambda: iter_frame_chunks(result_df), f"chat_result_{msg['id']}", key=f"chat_export_{msg['id']}"
+    )
+
+    # 🏀 Show player headshots for the first players in the result
+    if eager and msg['players']:
+        st.markdown("#### 🏀 Players in this result")
+        cols = st.columns(len(msg['players']))
+        for col, name in zip(cols, msg['players']):
+            player_id = None
+            if 'player_id' in result_df.columns:
+                matching_ids = result_df.loc[result_df['player_name'] == name, 'player_id']
+                if not matching_ids.empty:
+                    player_id = matching_ids.iloc[0]
+
+            if player_id is None:
+                player_id = PLAYER_ID_MAP.get(name)
+
+            with col:
+                st.image(get_player_image_url(name, player_id), caption=name, use_column_width=True)
+
+
+def normalize_question(question):
+    """Lowercase a question, keeping team codes in capitals, and collapse punctuation and whitespace."""
+    text = re.sub(r"[^\w$.,<>=\s]", " ", question.strip())
+    text = re.sub(r"[A-Za-z]+", lambda match: match.group() if match.group() in QUERY_TEAM_CODES else match.group().lower(), text)
+    return re.sub(r"\s+", " ", text).strip(" .")
+
+
+def parse_query_plan(question):
+    """Parse a normalized question into a plan: filters, group-by, aggregate, metric, order and limit.
+
+    Returns ``(plan, error)``. Only whitelisted columns and parsed numbers reach the plan, so
+    question text is never interpolated into SQL.
+    """
+    # Numeric filters in the order they appear; their text is blanked so "at least 60 games" is
+    # neither a ranking word nor the metric to sort by.
+    positioned = []
+    remaining = question
+    for pattern in QUERY_RANGE_PATTERNS:
+        for match in pattern.finditer(remaining):
+            high_unit = QUERY_NUMBER_UNITS.get(match.group('high_unit'), 1)
+            low_unit = QUERY_NUMBER_UNITS.get(match.group('low_unit'), high_unit)
+            column = QUERY_METRIC_SYNONYMS[match.groupdict().get('metric') or 'salary']
+            low = float(match.group('low').replace(',', '')) * low_unit
+            high = float(match.group('high').replace(',', '')) * high_unit
+            positioned.append((match.start(), (column, '>=', min(low, high))))
+            positioned.append((match.start(), (column, '<=', max(low, high))))
+        remaining = pattern.sub(lambda match: ' ' * len(match.group()), remaining)
+    for pattern in QUERY_FILTER_PATTERNS:
+        for match in pattern.finditer(remaining):
+            value = float(match.group('number').replace(',', '')) * QUERY_NUMBER_UNITS.get(match.group('unit'), 1)
+            column = QUERY_METRIC_SYNONYMS[match.groupdict().get('metric') or 'salary']
+            positioned.append((match.start(), (column, QUERY_COMPARATORS[match.group('op')], value)))
+        remaining = pattern.sub(lambda match: ' ' * len(match.group()), remaining)
+    filters = [query_filter for _, query_filter in sorted(positioned, key=lambda item: item[0])]
+    teams = set()
+    for pattern, names in QUERY_TEAM_PATTERNS:
+        teams.update(names[match.group('team')] for match in pattern.finditer(remaining))
+        remaining = pattern.sub(lambda match: ' ' * len(match.group()), remaining)
+    if QUERY_UNPARSED_TEAM_PATTERN.search(remaining):
+        return None, "Could not recognize the team in that question. Use a team name or code, e.g. 'on the Lakers' or 'on LAL'"
+    if QUERY_UNPARSED_RANGE_PATTERN.search(remaining):
+        return None, "Could not read the range in that question. Try: 'salary between 10 and 20 million'"
+    if teams:
+        filters.append(('team_name', 'in', sorted(teams)))
+    label = QUERY_LABEL_PATTERN.search(question)
+    if label:
+        filters.append(('contract_value_label', '==', label.group(1).capitalize()))
+
+    metrics = [QUERY_METRIC_SYNONYMS[phrase] for phrase in QUERY_METRIC_PATTERN.findall(remaining)]
+    aggregate = QUERY_AGGREGATE_PATTERN.search(remaining)
+    aggregate = QUERY_AGGREGATES[aggregate.group(1)] if aggregate else None
+    group_by = 'team_name' if QUERY_GROUP_PATTERN.search(question) else None
+    if group_by and aggregate is None:
+        aggregate = 'sum' if 'payroll' in question else 'mean'
+    if not (metrics or filters or aggregate == 'count'):
+        return None, "Could not plan that question. Try: 'top 5 scorers', 'average salary by team', 'underpaid players with over 15 points'"
+
+    metric = metrics[0] if metrics else next((f[0] for f in filters if f[1] not in ('in', '==')), 'pts')
+    descending = not QUERY_ASCENDING_PATTERN.search(remaining)
+    ranked = bool(QUERY_DESCENDING_PATTERN.search(remaining) or QUERY_ASCENDING_PATTERN.search(remaining))
+    limit_match = QUERY_LIMIT_PATTERN.search(remaining)
+    if limit_match:
+        limit = int(limit_match.group(1) or limit_match.group(2))
+    elif QUERY_SINGULAR_PATTERN.search(question) and (ranked or not group_by):
+        limit = 1
+    elif ranked and not group_by:
+        limit = QUERY_DEFAULT_LIMIT
+    else:
+        limit = None
+
+    columns = ['player_name', 'team_name']
+    for column in [metric, *(f[0] for f in filters), 'salary_usd']:
+        if column not in columns:
+            columns.append(column)
+    return {
+        'filters': filters,
+        'group_by': group_by,
+        'aggregate': aggregate,
+        'metric': None if aggregate == 'count' else metric,
+        'descending': descending,
+        'limit': limit,
+        'columns': columns,
+    }, None
+
+
+def query_output_name(plan):
+    if plan['aggregate'] == 'count':
+        return 'player_count'
+    return f"{QUERY_AGGREGATE_PREFIXES[plan['aggregate']]}_{QUERY_COLUMN_ALIASES.get(plan['metric'], plan['metric'])}"
+
+
+def render_query_sql(plan):
+    """SQL equivalent of a plan, shown alongside the answer."""
+    conditions = []
+    for column, op, value in plan['filters']:
+        if op == 'in':
+            conditions.append(f"{column} IN ({', '.join(repr(v) for v in value)})")
+        elif isinstance(value, str):
+            conditions.append(f"{column} {'=' if op == '==' else op} {value!r}")
+        elif float(value).is_integer():
+            conditions.append(f"{column} {op} {value:.0f}")
+        else:
+            conditions.append(f"{column} {op} {value:g}")
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    direction = 'DESC' if plan['descending'] else 'ASC'
+    if plan['aggregate']:
+        name = query_output_name(plan)
+        expression = 'COUNT(*)' if plan['aggregate'] == 'count' else f"{plan['aggregate'].upper().replace('MEAN', 'AVG')}({plan['metric']})"
+        if plan['group_by']:
+            sql = f"SELECT {plan['group_by']}, {expression} AS {name} FROM players{where} GROUP BY {plan['group_by']} ORDER BY {name} {direction}"
+        else:
+            sql = f"SELECT {expression} AS {name} FROM players{where}"
+    else:
+        sql = f"SELECT {', '.join(plan['columns'])} FROM players{where} ORDER BY {plan['metric']} {direction}"
+    return sql + (f" LIMIT {plan['limit']}" if plan['limit'] else "")
+
+
+def compile_query_plan(plan):
+    """Compile a plan into a function of a frame: one vectorized mask, then a pandas reduction or sort."""
+    filters = [(column, QUERY_OPERATORS[op], value) for column, op, value in plan['filters']]
+    aggregate, group_by, metric, limit = plan['aggregate'], plan['group_by'], plan['metric'], plan['limit']
+    name = query_output_name(plan) if aggregate else None
+
+    def run(df):
+        mask = np.ones(len(df), dtype=bool)
+        for column, compare, value in filters:
+            mask &= compare(df[column], value).to_numpy(dtype=bool)
+        frame = df[mask] if not mask.all() else df
+        if aggregate and group_by:
+            grouped = frame.groupby(group_by, observed=True)
+            values = grouped.size() if aggregate == 'count' else grouped[metric].agg(aggregate)
+            result = values.rename(name).reset_index().sort_values(name, ascending=not plan['descending'])
+        elif aggregate:
+            value = len(frame) if aggregate == 'count' else frame[metric].agg(aggregate)
+            result = pd.DataFrame({name: [value]})
+        else:
+            result = frame[plan['columns']].sort_values(metric, ascending=not plan['descending'])
+        return (result.head(limit) if limit else result).reset_index(drop=True)
+
+    return run
+
+
+def get_query_plan(question):
+    """Parsed plan, SQL and compiled runner for a question, cached by its normalized text."""
+    normalized = normalize_question(question)
+
+    def build():
+        plan, error = parse_query_plan(normalized)
+        if error:
+            return {'plan': None, 'sql': None, 'run': None, 'error': error}
+        return {'plan': plan, 'sql': render_query_sql(plan), 'run': compile_query_plan(plan), 'error': None}
+
+    return get_cached_artifact(('query_plan', normalized), build)
+
+
+def query_columns(plan):
+    columns = {column for column, _, _ in plan['filters']} | {plan['group_by'], plan['metric']}
+    if not plan['aggregate']:
+        columns |= set(plan['columns'])
+    return columns - {None}
+
+
+def execute_natural_language_query(query, df):
+    compiled = get_query_plan(query)
+    if compiled['error']:
+        return None, compiled['error']
+
+    try:
+        needed = query_columns(compiled['plan'])
+        derived = [col for col in needed if col not in df.columns and col in DERIVED_METRICS]
+        if derived:
+            df = with_metrics(df, derived)
+        if 'predicted_salary' in needed and 'predicted_salary' not in df.columns:
+            df = with_salary_predictions(df)
+        return compiled['run'](df), compiled['sql']
+    except Exception as e:
+        return None, f"Execution error: {str(e)}"
+
+def search_players(df, name='', team=None, min_salary=None, max_salary=None, min_pts=None):
+    """Players matching a name fragment, team, salary range and scoring floor, combined into one mask."""
+    mask = pd.Series(True, index=df.index)
+    if name:
+        mask &= df['player_name'].astype(str).str.contains(name, case=False, regex=False, na=False)
+    if team:
+        mask &= df['team_name'] == team
+    if min_salary is not None:
+        mask &= df['salary_usd'] >= min_salary
+    if max_salary is not None:
+        mask &= df['salary_usd'] <= max_salary
+    if min_pts:
+        mask &= df['pts'] >= min_pts
+    return df[mask]
 
-    return df
 
+def _json_records(frame):
+    """Frame rows as plain JSON-ready dicts (NaN becomes ``None``)."""
+    return json.loads(frame.to_json(orient='records'))
 
-def calculate_contract_efficiency(df):
-    """Derive the Contract Efficiency Score (CES) with normalized production and value tiers."""
-    work_df = df.copy()
 
-    numeric_cols = ['salary_usd', 'pts', 'reb', 'assists']
-    for col in numeric_cols:
-        if col in work_df.columns:
-            work_df[col] = pd.to_numeric(work_df[col], errors='coerce').fillna(0)
-        else:
-            work_df[col] = 0
+API_ITEM_TYPES = {dict: 'an object', str: 'a string'}
 
-    stat_max = {
-        'pts': max(work_df['pts'].max(), 1),
-        'reb': max(work_df['reb'].max(), 1),
-        'assists': max(work_df['assists'].max(), 1),
-    }
 
-    work_df['norm_pts'] = work_df['pts'] / stat_max['pts']
-    work_df['norm_reb'] = work_df['reb'] / stat_max['reb']
-    work_df['norm_assists'] = work_df['assists'] / stat_max['assists']
+def _api_batch(payload, key, item_type):
+    """The ``key`` list from a payload; malformed batches raise ``ValueError`` (a 400)."""
+    items = payload.get(key)
+    if not isinstance(items, list) or not items:
+        raise ValueError(f"'{key}' must be a non-empty list")
+    if len(items) > API_MAX_BATCH:
+        raise ValueError(f"'{key}' accepts at most {API_MAX_BATCH} items per request")
+    for position, item in enumerate(items):
+        if not isinstance(item, item_type):
+            raise ValueError(f"'{key}[{position}]' must be {API_ITEM_TYPES[item_type]}")
+    return items
 
-    salary_millions = work_df['salary_usd'] / 1_000_000
-    salary_millions = salary_millions.replace({0: pd.NA})
 
-    normalized_performance = (
-        (work_df['norm_pts'] * 0.6)
-        + (work_df['norm_reb'] * 0.25)
-        + (work_df['norm_assists'] * 0.15)
+def _api_number(value, name, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a number") from None
+
+
+def _api_trade(trade, position):
+    """Validate one trade object; returns ``(team_a, team_b, outgoing_a, outgoing_b)``."""
+    missing = [key for key in ('team_a', 'team_b') if not isinstance(trade.get(key), str)]
+    if missing:
+        raise ValueError(f"'trades[{position}]' needs string {' and '.join(missing)}")
+    outgoing = []
+    for key in ('outgoing_a', 'outgoing_b'):
+        players = trade.get(key, [])
+        if not isinstance(players, list) or not all(isinstance(player, str) for player in players):
+            raise ValueError(f"'trades[{position}].{key}' must be a list of player names")
+        outgoing.append(list(players))
+    return trade['team_a'], trade['team_b'], *outgoing
+
+
+def get_api_frame(df):
+    """Base data with CES, salary ratios and predicted salary, shared by the API handlers."""
+    return get_cached_artifact(
+        ('api_frame', df.attrs.get('data_version')),
+        lambda: with_salary_predictions(calculate_contract_efficiency(ensure_salary_efficiency_columns(df))),
     )
-    work_df['contract_efficiency_score'] = (normalized_performance / salary_millions).fillna(0)
 
-    percentiles = work_df['contract_efficiency_score'].quantile([0.4, 0.75]).to_list()
-    lower_cutoff, upper_cutoff = percentiles if len(percentiles) == 2 else (0, 0)
 
-    def value_tier(score):
-        if score >= upper_cutoff:
-            return "Underpaid"
-        if score >= lower_cutoff:
-            return "Fair"
-        return "Overpaid"
+def api_health(df, payload):
+    return {'status': 'ok', 'data_version': df.attrs.get('data_version'), 'rows': len(df)}
+
+
+def api_ces(df, payload):
+    """CES, value label and fair-salary ceilings for listed ``players``, or scores for hypothetical ``contracts``."""
+    frame = get_api_frame(df)
+    if 'contracts' in payload:
+        contracts = pd.DataFrame(_api_batch(payload, 'contracts', dict))
+        for col in ['salary_usd', *CES_BASIS_COLUMNS]:
+            if col not in contracts.columns:
+                raise ValueError(f"Every contract needs '{col}'")
+            contracts[col] = pd.to_numeric(contracts[col], errors='coerce')
+        # Score against the league: hypothetical rows join the normalization and tier cutoffs.
+        combined = pd.concat([frame[['salary_usd', *CES_BASIS_COLUMNS]], contracts], ignore_index=True)
+        scored = calculate_contract_efficiency(combined).iloc[len(frame):]
+        contracts['contract_efficiency_score'] = scored['contract_efficiency_score'].to_numpy()
+        contracts['contract_value_label'] = scored['contract_value_label'].astype(str).to_numpy()
+        return {'contracts': _json_records(contracts)}
+
+    names = _api_batch(payload, 'players', str)
+    player_index = get_base_player_index(df)
+    fair = cached_call(solve_fair_salaries, frame)
+    labels = [player_index['by_id'].get(player_index['name_to_id'].get(name)) for name in names]
+    found = [label for label in labels if label is not None]
+    rows = frame.loc[found, ['player_name', 'team_name', 'salary_usd', 'predicted_salary', 'contract_efficiency_score', 'contract_value_label']]
+    rows = rows.join(fair.loc[found, ['fair_salary_ceiling', 'underpaid_salary_ceiling']])
+    return {
+        'players': _json_records(rows),
+        'not_found': [name for name, label in zip(names, labels) if label is None],
+    }
 
-    work_df['contract_value_label'] = work_df['contract_efficiency_score'].apply(value_tier)
-    return work_df
 
+def api_trades(df, payload):
+    """Cap-rules outcome for a batch of ``trades``, evaluated in one vectorized pass."""
+    frame = get_api_frame(df)
+    trades = []
+    errors = {}
+    rosters = cached_call(build_team_rosters, frame)
+    for position, trade in enumerate(_api_batch(payload, 'trades', dict)):
+        team_a, team_b, outgoing_a, outgoing_b = _api_trade(trade, position)
+        problems = [] if team_a and team_b and team_a != team_b else ["Select two different teams."]
+        for team, players in ((team_a, outgoing_a), (team_b, outgoing_b)):
+            unknown = sorted(set(players) - set(rosters.get(team, [])))
+            if unknown:
+                problems.append(f"Not on {team}: {', '.join(unknown)}")
+        if problems:
+            errors[position] = problems
+        trades.append((team_a, team_b, outgoing_a, outgoing_b))
+
+    evaluated = evaluate_trade_batch(trades, frame)
+    sides = _json_records(evaluated.drop(columns=['trade']))
+    results = []
+    for position in range(len(trades)):
+        team_rows = sides[2 * position:2 * position + 2]
+        results.append({
+            'trade': position,
+            'legal': position not in errors and all(row['legal'] for row in team_rows),
+            'errors': errors.get(position, []),
+            'sides': team_rows,
+        })
+    return {'trades': results}
 
-@st.cache_data
-def load_data():
-    df = pd.read_excel('Full_NBA_Dataset.xlsx')
-    df = ensure_salary_efficiency_columns(df)
-    return df
 
+def api_search(df, payload):
+    """Run each of ``queries`` (name, team, min/max salary, min points, limit) against the player table.
 
-def get_contract_records(base_df):
-    """Return session-scoped contract data with CES columns applied."""
-    if 'contract_records' not in st.session_state:
-        st.session_state.contract_records = calculate_contract_efficiency(base_df)
-    return st.session_state.contract_records
+    A GET with plain query parameters is treated as a batch of one.
+    """
+    frame = get_api_frame(df)
+    columns = ['player_name', 'player_id', 'team_name', 'pts', 'reb', 'assists', 'salary_usd', 'predicted_salary', 'contract_efficiency_score']
+    queries = _api_batch(payload, 'queries', dict) if 'queries' in payload else [payload]
+    results = []
+    for query in queries:
+        bounds = {key: query.get(key) for key in ('min_salary', 'max_salary', 'min_pts')}
+        bounds = {key: None if value in (None, '') else _api_number(value, key) for key, value in bounds.items()}
+        matches = search_players(
+            frame,
+            name=str(query.get('name') or ''),
+            team=str(query['team']) if query.get('team') else None,
+            **bounds,
+        )
+        limit = _api_number(query.get('limit', 25), 'limit', int)
+        results.append({'total': len(matches), 'players': _json_records(matches[columns].head(limit))})
+    return {'results': results}
 
 
-def persist_contract_records(updated_df):
-    """Recalculate CES and persist updated contract records back into session state."""
-    st.session_state.contract_records = calculate_contract_efficiency(updated_df)
-    return st.session_state.contract_records
+def api_rag(df, payload):
+    """Top ``top_k`` knowledge-base documents for each of ``questions``."""
+    _, vector_index = get_base_rag_index(df)
+    top_k = _api_number(payload.get('top_k', 3), 'top_k', int)
+    return {
+        'results': [
+            {'question': question, 'documents': retrieve_documents(question, vector_index, top_k=top_k)}
+            for question in _api_batch(payload, 'questions', str)
+        ]
+    }
 
 
-def simulate_ces_for_salary(player_name, new_salary, current_df):
-    """Simulate a CES and value label for a player after changing their salary."""
-    work_df = current_df.copy()
-    player_mask = work_df['player_name'] == player_name
-    if not player_mask.any():
-        return None
+def api_query(df, payload):
+    """Answer each of ``questions`` with the natural-language query planner."""
+    results = []
+    for question in _api_batch(payload, 'questions', str):
+        result_df, sql_or_error = execute_natural_language_query(question, df)
+        if result_df is None:
+            results.append({'question': question, 'error': sql_or_error})
+        else:
+            results.append({'question': question, 'sql': sql_or_error, 'rows': _json_records(result_df)})
+    return {'results': results}
 
-    work_df.loc[player_mask, 'salary_usd'] = new_salary
-    recalculated_df = calculate_contract_efficiency(work_df)
-    return recalculated_df.loc[player_mask].iloc[0]
 
+API_ROUTES = {
+    '/health': api_health,
+    '/ces': api_ces,
+    '/trades': api_trades,
+    '/search': api_search,
+    '/rag': api_rag,
+    '/query': api_query,
+}
 
-def format_player_metric(player_data, key, fmt="{:.1f}", default="N/A"):
-    """Format a player's metric safely, returning a friendly fallback when missing."""
-    if key in player_data.index and pd.notnull(player_data[key]):
-        try:
-            return fmt.format(player_data[key])
-        except Exception:
-            pass
-    return default
 
+def run_api_handler(handler, df, payload):
+    """Run a handler, reusing the cached response for the same payload and data version."""
+    key = ('api', handler.__name__, json.dumps(payload, sort_keys=True, default=str), df.attrs.get('data_version'))
+    return get_cached_artifact(key, lambda: handler(df, payload))
 
-def get_numeric_stat(player_data, key, default=0):
-    """Safely fetch a numeric stat for visualizations without raising KeyError."""
+
+async def dispatch_api_request(method, target, body, df, executor):
+    """Route one request; returns ``(status, response)``."""
+    url = urlsplit(target)
+    handler = API_ROUTES.get(url.path.rstrip('/') or '/')
+    if handler is None:
+        return 404, {'error': f"Unknown endpoint {url.path}", 'endpoints': sorted(API_ROUTES)}
     try:
-        value = player_data.get(key, default)
-        if pd.notnull(value):
-            return value
-    except Exception:
+        if method == 'GET':
+            payload = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        elif method == 'POST':
+            payload = json.loads(body or b'{}')
+        else:
+            return 405, {'error': f"{method} is not supported"}
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        loop = asyncio.get_running_loop()
+        return 200, await loop.run_in_executor(executor, run_api_handler, handler, df, payload)
+    except ValueError as e:
+        return 400, {'error': str(e)}
+    except Exception as e:
+        return 500, {'error': f"{type(e).__name__}: {e}"}
+
+
+async def handle_api_connection(reader, writer, df, executor):
+    """Serve HTTP/1.1 requests on one connection until the client closes it."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get('content-length') or 0)
+            if length > API_MAX_BODY_BYTES:
+                status, response = 413, {'error': f"Request body exceeds {API_MAX_BODY_BYTES:,} bytes"}
+                keep_alive = False
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, response = await dispatch_api_request(method.upper(), target, body, df, executor)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+            data = json.dumps(response, default=str).encode()
+            writer.write(
+                f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
         pass
-    return default
+    finally:
+        writer.close()
 
 
-def compute_team_financials(contract_df, team_name):
-    """Return salary, cap space, and luxury exposure for a team."""
-    salary = contract_df.loc[contract_df['team_name'] == team_name, 'salary_usd'].sum()
-    cap_space = SALARY_CAP - salary
-    luxury_tax_exposure = max(0.0, salary - LUXURY_TAX_THRESHOLD)
-    return salary, cap_space, luxury_tax_exposure
+def serve_api(host=API_DEFAULT_HOST, port=API_DEFAULT_PORT, workers=API_WORKERS):
+    """Serve the JSON API over the loaded (or memory-mapped prepared) dataset until interrupted."""
+    df = load_data()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
 
+    async def main():
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_api_connection(reader, writer, df, executor), host, port
+        )
+        print(f"Serving {len(df):,} rows (data version {df.attrs.get('data_version')}) on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
 
-def get_team_players(contract_df, team_name):
-    return contract_df.loc[contract_df['team_name'] == team_name, 'player_name'].sort_values().tolist()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
-def evaluate_trade(team_a, team_b, outgoing_a, outgoing_b, contract_df):
-    """Evaluate a two-team trade and return cap impact and validation flags."""
-    errors = []
-
-    if not team_a or not team_b:
-        errors.append("Select two teams to evaluate a trade.")
-    if team_a and team_b and team_a == team_b:
-        errors.append("Teams must be different for a trade.")
-
-    def validate_players(team_name, outgoing_players):
-        invalid = []
-        team_roster = contract_df.loc[contract_df['team_name'] == team_name, 'player_name'].tolist()
-        for player in outgoing_players:
-            if player not in team_roster:
-                invalid.append(player)
-        return invalid
-
-    if team_a:
-        invalid_a = validate_players(team_a, outgoing_a)
-        if invalid_a:
-            errors.append(f"Invalid selections for {team_a}: {', '.join(invalid_a)}")
-    if team_b:
-        invalid_b = validate_players(team_b, outgoing_b)
-        if invalid_b:
-            errors.append(f"Invalid selections for {team_b}: {', '.join(invalid_b)}")
-
-    salary_a_pre, cap_a_pre, luxury_a_pre = compute_team_financials(contract_df, team_a) if team_a else (0, 0, 0)
-    salary_b_pre, cap_b_pre, luxury_b_pre = compute_team_financials(contract_df, team_b) if team_b else (0, 0, 0)
-
-    outgoing_a_salary = contract_df.loc[
-        (contract_df['team_name'] == team_a) & (contract_df['player_name'].isin(outgoing_a)), 'salary_usd'
-    ].sum()
-    outgoing_b_salary = contract_df.loc[
-        (contract_df['team_name'] == team_b) & (contract_df['player_name'].isin(outgoing_b)), 'salary_usd'
-    ].sum()
-
-    incoming_a_salary = contract_df.loc[
-        (contract_df['team_name'] == team_b) & (contract_df['player_name'].isin(outgoing_b)), 'salary_usd'
-    ].sum()
-    incoming_b_salary = contract_df.loc[
-        (contract_df['team_name'] == team_a) & (contract_df['player_name'].isin(outgoing_a)), 'salary_usd'
-    ].sum()
-
-    salary_a_post = salary_a_pre - outgoing_a_salary + incoming_a_salary
-    salary_b_post = salary_b_pre - outgoing_b_salary + incoming_b_salary
-
-    def team_ces(team):
-        return contract_df.loc[contract_df['team_name'] == team, 'contract_efficiency_score'].sum()
-
-    ces_a_pre = team_ces(team_a) if team_a else 0
-    ces_b_pre = team_ces(team_b) if team_b else 0
-
-    outgoing_a_ces = contract_df.loc[
-        (contract_df['team_name'] == team_a) & (contract_df['player_name'].isin(outgoing_a)), 'contract_efficiency_score'
-    ].sum()
-    outgoing_b_ces = contract_df.loc[
-        (contract_df['team_name'] == team_b) & (contract_df['player_name'].isin(outgoing_b)), 'contract_efficiency_score'
-    ].sum()
-
-    incoming_a_ces = contract_df.loc[
-        (contract_df['team_name'] == team_b) & (contract_df['player_name'].isin(outgoing_b)), 'contract_efficiency_score'
-    ].sum()
-    incoming_b_ces = contract_df.loc[
-        (contract_df['team_name'] == team_a) & (contract_df['player_name'].isin(outgoing_a)), 'contract_efficiency_score'
-    ].sum()
-
-    ces_a_post = ces_a_pre - outgoing_a_ces + incoming_a_ces
-    ces_b_post = ces_b_pre - outgoing_b_ces + incoming_b_ces
-
-    def cap_status(post_salary):
-        if post_salary > LUXURY_TAX_THRESHOLD:
-            return "Luxury Tax Risk"
-        if post_salary > SALARY_CAP:
-            return "Over Cap"
-        return "Cap Compliant"
-
-    team_results = {
-        'team_a': {
-            'team': team_a,
-            'salary_pre': salary_a_pre,
-            'salary_post': salary_a_post,
-            'cap_space_pre': cap_a_pre,
-            'cap_space_post': SALARY_CAP - salary_a_post,
-            'luxury_pre': luxury_a_pre,
-            'luxury_post': max(0.0, salary_a_post - LUXURY_TAX_THRESHOLD),
-            'salary_delta': salary_a_post - salary_a_pre,
-            'ces_pre': ces_a_pre,
-            'ces_post': ces_a_post,
-            'ces_delta': ces_a_post - ces_a_pre,
-            'status': cap_status(salary_a_post)
-        },
-        'team_b': {
-            'team': team_b,
-            'salary_pre': salary_b_pre,
-            'salary_post': salary_b_post,
-            'cap_space_pre': cap_b_pre,
-            'cap_space_post': SALARY_CAP - salary_b_post,
-            'luxury_pre': luxury_b_pre,
-            'luxury_post': max(0.0, salary_b_post - LUXURY_TAX_THRESHOLD),
-            'salary_delta': salary_b_post - salary_b_pre,
-            'ces_pre': ces_b_pre,
-            'ces_post': ces_b_post,
-            'ces_delta': ces_b_post - ces_b_pre,
-            'status': cap_status(salary_b_post)
+async def _api_request(reader, writer, host, path, payload):
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+def build_api_benchmark_requests(roster, distinct, seed=0):
+    """A repeatable mix of ``distinct`` requests across every endpoint, built from a league roster."""
+    rng = random.Random(seed)
+    by_team = {}
+    for player in roster:
+        by_team.setdefault(player['team_name'], []).append(player['player_name'])
+    teams = sorted(by_team)
+    questions = ["top 5 scorers", "average salary by team", "underpaid players with over 15 points", "total payroll by team"]
+    requests = []
+    for position in range(distinct):
+        kind = position % 5
+        if kind == 0:
+            trades = []
+            for _ in range(20):
+                team_a, team_b = rng.sample(teams, 2)
+                trades.append({
+                    'team_a': team_a,
+                    'team_b': team_b,
+                    'outgoing_a': rng.sample(by_team[team_a], 1),
+                    'outgoing_b': rng.sample(by_team[team_b], 1),
+                })
+            requests.append(('/trades', {'trades': trades}))
+        elif kind == 1:
+            requests.append(('/ces', {'players': rng.sample([player['player_name'] for player in roster], 25)}))
+        elif kind == 2:
+            requests.append(('/search', {'queries': [{'team': team, 'min_pts': rng.randint(0, 15)} for team in rng.sample(teams, 5)]}))
+        elif kind == 3:
+            requests.append(('/rag', {'questions': [f"How do {rng.choice(teams)} trades affect the luxury tax?"]}))
+        else:
+            requests.append(('/query', {'questions': [f"{rng.choice(questions)} on {rng.choice(teams)}"]}))
+    return requests
+
+
+def run_api_benchmark(host=API_DEFAULT_HOST, port=API_DEFAULT_PORT, total=500, concurrency=16, distinct=100):
+    """Drive a running API with ``concurrency`` keep-alive clients; returns throughput and latency stats."""
+
+    async def main():
+        reader, writer = await asyncio.open_connection(host, port)
+        _, body = await _api_request(reader, writer, host, '/search', {'queries': [{'limit': 100_000}]})
+        writer.close()
+        roster = json.loads(body)['results'][0]['players']
+        mix = build_api_benchmark_requests(roster, distinct)
+        queue = [mix[position % len(mix)] for position in range(total)]
+        latencies, statuses = [], Counter()
+
+        async def client():
+            reader, writer = await asyncio.open_connection(host, port)
+            try:
+                while queue:
+                    path, payload = queue.pop()
+                    started = time.perf_counter()
+                    status, _ = await _api_request(reader, writer, host, path, payload)
+                    latencies.append(time.perf_counter() - started)
+                    statuses[status] += 1
+            finally:
+                writer.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        latency_ms = np.array(latencies) * 1000
+        return {
+            'requests': len(latencies),
+            'seconds': elapsed,
+            'requests_per_second': len(latencies) / elapsed,
+            'p50_ms': float(np.percentile(latency_ms, 50)),
+            'p95_ms': float(np.percentile(latency_ms, 95)),
+            'p99_ms': float(np.percentile(latency_ms, 99)),
+            'statuses': dict(statuses),
         }
-    }
 
-    violations = []
-    for label, result in team_results.items():
-        if result['salary_post'] > LUXURY_TAX_THRESHOLD:
-            violations.append(f"{result['team']} exceeds the luxury tax threshold.")
-        elif result['salary_post'] > SALARY_CAP:
-            violations.append(f"{result['team']} exceeds the salary cap.")
+    return asyncio.run(main())
 
-    return {
-        'errors': errors,
-        'team_results': team_results,
-        'violations': violations,
-        'outgoing_a_salary': outgoing_a_salary,
-        'outgoing_b_salary': outgoing_b_salary,
-    }
 
-def generate_sql_query(natural_language_query, df_columns):
-    query_lower = natural_language_query.lower()
-    
-    dangerous_keywords = ['drop', 'delete', 'truncate', 'alter', 'create', 'insert']
-    if any(keyword in query_lower for keyword in dangerous_keywords):
-        return None, "Security Error: Potentially dangerous SQL keywords detected"
-    
-    if 'top' in query_lower and 'scorer' in query_lower:
-        n = 5
-        match = re.search(r'top (\d+)', query_lower)
-        if match:
-            n = int(match.group(1))
-        return f"SELECT player_name, team_name, pts, salary_usd FROM players ORDER BY pts DESC LIMIT {n}", None
-    
-    elif 'average' in query_lower or 'avg' in query_lower:
-        if 'salary' in query_lower:
-            return "SELECT AVG(salary_usd) as avg_salary FROM players", None
-        elif 'points' in query_lower or 'pts' in query_lower:
-            return "SELECT AVG(pts) as avg_points FROM players", None
-    
-    elif 'team' in query_lower and 'highest' in query_lower:
-        return "SELECT team_name, AVG(pts) as avg_pts FROM players GROUP BY team_name ORDER BY avg_pts DESC LIMIT 1", None
-    
-    else:
-        return None, "Could not generate SQL query. Try: 'top 5 scorers', 'average salary', 'most efficient players'"
+def _cli_option(name, default=None):
+    """Value following ``name`` on the command line, or ``default``."""
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv[:-1] else default
 
-def execute_natural_language_query(query, df):
-    sql_query, error = generate_sql_query(query, df.columns.tolist())
-    
-    if error:
-        return None, error
-    
-    try:
-        if 'top' in query.lower() and 'scorer' in query.lower():
-            n = 5
-            match = re.search(r'top (\d+)', query.lower())
-            if match:
-                n = int(match.group(1))
-            result = df.nlargest(n, 'pts')[['player_name', 'team_name', 'pts', 'salary_usd']]
-            return result, sql_query
-        
-        elif 'average salary' in query.lower():
-            result = pd.DataFrame({'avg_salary': [df['salary_usd'].mean()]})
-            return result, sql_query
-        
-        elif 'average points' in query.lower():
-            result = pd.DataFrame({'avg_points': [df['pts'].mean()]})
-            return result, sql_query
-        
-        elif 'team' in query.lower() and 'highest' in query.lower():
-            result = df.groupby('team_name')['pts'].mean().reset_index()
-            result.columns = ['team_name', 'avg_pts']
-            result = result.nlargest(1, 'avg_pts')
-            return result, sql_query
-        
-        return None, "Query execution failed"
-    except Exception as e:
-        return None, f"Execution error: {str(e)}"
+
+def _cli_address(value):
+    host, _, port = value.rpartition(':')
+    return host or API_DEFAULT_HOST, int(port)
+
+
+# Loader process for multi-process deployments: `python app_nba.py --prepare-dataset contracts.arrow`
+# writes the shared file and exits before any page renders.
+if __name__ == '__main__' and not st.runtime.exists() and '--prepare-dataset' in sys.argv[:-1]:
+    output_path = sys.argv[sys.argv.index('--prepare-dataset') + 1]
+    print(f"Wrote {write_prepared_dataset(output_path):,} rows to {output_path}")
+    sys.exit(0)
+
+# Headless API: `python app_nba.py --serve-api 8765 [--workers 4]`, and a load generator against
+# it: `python app_nba.py --benchmark-api 8765 [--requests 500] [--concurrency 16] [--distinct 100]`.
+if __name__ == '__main__' and not st.runtime.exists() and '--serve-api' in sys.argv[:-1]:
+    api_host, api_port = _cli_address(_cli_option('--serve-api'))
+    serve_api(api_host, api_port, workers=int(_cli_option('--workers', API_WORKERS)))
+    sys.exit(0)
+
+if __name__ == '__main__' and not st.runtime.exists() and '--benchmark-api' in sys.argv[:-1]:
+    api_host, api_port = _cli_address(_cli_option('--benchmark-api'))
+    stats = run_api_benchmark(
+        api_host,
+        api_port,
+        total=int(_cli_option('--requests', 500)),
+        concurrency=int(_cli_option('--concurrency', 16)),
+        distinct=int(_cli_option('--distinct', 100)),
+    )
+    print(json.dumps(stats, indent=2))
+    sys.exit(0)
+
+warmup_status = start_warmup()
 
 try:
     df = load_data()
-    PLAYER_ID_MAP = dict(zip(df['player_name'], df['player_id']))
+    PLAYER_ID_MAP = get_base_player_index(df)['name_to_id']
     data_loaded = True
 except Exception as e:
     st.error(f"Error loading data: {e}")
@@ -662,11 +3797,20 @@ page = st.sidebar.radio(
         "Analytics",
         "Contract Efficiency Score",
         "Trade Approval",
+        "Budget Optimizer",
         "LLM Chat",
+        "Memory Usage",
     ],
     help="Select a page to navigate"
 )
 st.sidebar.markdown("---")
+warmup_ready = sum(state == 'ready' for state in warmup_status['stages'].values())
+if warmup_status['finished'] is None:
+    st.sidebar.caption(f"⏳ Warming up caches: {warmup_ready}/{len(WARMUP_STAGES)} ready")
+elif warmup_status['errors']:
+    st.sidebar.caption(f"⚠️ Warm-up incomplete: {', '.join(warmup_status['errors'])} failed")
+else:
+    st.sidebar.caption(f"✅ Caches warm ({warmup_status['finished'] - warmup_status['started']:.1f}s)")
 st.sidebar.info("**NBA Player Impact Analysis**\n\nMeasuring value and performance")
 
 # ============================================
@@ -732,83 +3876,20 @@ if page == "Project Summary":
 
         st.markdown("### 🏆 Hall of Fame - Top 5 Scorers")
 
-        top5 = df.nlargest(5, 'pts')[['player_name', 'player_id', 'team_name', 'pts', 'salary_usd']]
-        
-        medals = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣"]
-        colors = ["gold", "silver", "bronze", "", ""]
-        
-        for idx, (_, row) in enumerate(top5.iterrows()):
-            salary_m = row['salary_usd'] / 1000000
-            img_url = get_player_image_url(row['player_name'], row['player_id'])
-            team_abbrev = row['team_name']
-            team_colors = get_team_colors(team_abbrev)
-            
-            st.markdown(f"""
-                <div class='top-player {colors[idx]}' style='background: linear-gradient(135deg, {team_colors['primary']} 0%, {team_colors['secondary']} 100%); color: white;'>
-                    <span style='font-size: 1.5em; margin-right: 10px;'>{medals[idx]}</span>
-                    <img src="{img_url}" class="player-img">
-                    <div style='flex: 1;'>
-                        <strong style='font-size: 1.2em;'>{row['player_name']}</strong>
-                        <div style='font-size: 0.9em; opacity: 0.9;'>
-                            ⭐ {row['pts']:.1f} pts | 🏀 {row['team_name']} | 💰 ${salary_m:.1f}M
-                        </div>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+        hall_of_fame_cards, ppg_fig, salary_fig = get_project_summary_artifacts(df)
+        for card_html in hall_of_fame_cards:
+            st.markdown(card_html, unsafe_allow_html=True)
 
         st.markdown("<br>", unsafe_allow_html=True)
 
         st.markdown("### 📊 Quick Player Insights")
 
-        # Use each player's best stat line to avoid duplicate rows showing identical values
-        ppg_leader_rows = (
-            df.sort_values('pts', ascending=False)
-              .drop_duplicates(subset='player_name')
-        )
-        salary_leader_rows = (
-            df.sort_values('salary_usd', ascending=False)
-              .drop_duplicates(subset='player_name')
-        )
-
-        top_ppg = ppg_leader_rows.nlargest(10, 'pts')[['player_name', 'pts', 'team_name']]
-        top_salary = salary_leader_rows.nlargest(10, 'salary_usd')[['player_name', 'salary_usd', 'team_name']]
-
         col_ppg, col_salary = st.columns(2)
 
         with col_ppg:
-            ppg_fig = px.bar(
-                top_ppg,
-                x='player_name',
-                y='pts',
-                color='team_name',
-                title='Top 10 Scorers (PPG)',
-                labels={'player_name': 'Player', 'pts': 'Points per Game', 'team_name': 'Team'},
-                text='pts',
-            )
-            ppg_fig.update_traces(text=top_ppg['pts'].apply(lambda pts: f"{pts:.1f}"), textposition='outside')
-            ppg_fig.update_layout(xaxis_tickangle=-45, height=400, showlegend=False)
             st.plotly_chart(ppg_fig, use_container_width=True)
 
         with col_salary:
-            salary_fig = px.bar(
-                top_salary,
-                x='player_name',
-                y='salary_usd',
-                color='team_name',
-                title='Top 10 Highest Salaries',
-                labels={'player_name': 'Player', 'salary_usd': 'Salary (USD)', 'team_name': 'Team'},
-                text='salary_usd',
-            )
-            salary_fig.update_traces(
-                text=top_salary['salary_usd'].apply(lambda val: f"${val/1_000_000:,.1f}M"),
-                textposition='outside',
-            )
-            salary_fig.update_layout(
-                xaxis_tickangle=-45,
-                height=400,
-                yaxis_tickformat='$,.0f',
-                showlegend=False,
-            )
             st.plotly_chart(salary_fig, use_container_width=True)
 
     st.markdown("### 🛠️ Technologies Used")
@@ -830,6 +3911,8 @@ elif page == "Player Search":
     if not data_loaded:
         st.error("Data not loaded. Please check your data file.")
     else:
+        df = with_salary_predictions(ensure_salary_efficiency_columns(df))
+
         col1, col2 = st.columns([1, 2])
 
         with col1:
@@ -868,35 +3951,36 @@ elif page == "Player Search":
             st.markdown("### 📊 Search Results")
 
             if search_button:
-                filtered_df = df.copy()
-                
-                if name_pattern:
-                    filtered_df = filtered_df[filtered_df['player_name'].str.contains(name_pattern, case=False, na=False)]
-                
-                if selected_team != 'All Teams':
-                    filtered_df = filtered_df[filtered_df['team_name'] == selected_team]
-                
-                filtered_df = filtered_df[
-                    (filtered_df['salary_usd'] >= salary_range[0]) & 
-                    (filtered_df['salary_usd'] <= salary_range[1]) &
-                    (filtered_df['pts'] >= min_pts)
-                ]
+                # Keep the submitted search so zooming or clicking the chart reruns over the same results.
+                st.session_state.player_search = {
+                    'name': name_pattern,
+                    'team': None if selected_team == 'All Teams' else selected_team,
+                    'min_salary': salary_range[0],
+                    'max_salary': salary_range[1],
+                    'min_pts': min_pts,
+                }
+
+            if st.session_state.get('player_search') is not None:
+                filtered_df = search_players(df, **st.session_state.player_search)
                 
                 if not filtered_df.empty:
                     st.success(f"✅ Found {len(filtered_df)} players")
                     
                     # Display results table
                     display_df = filtered_df[
-                        ['player_name', 'player_id', 'team_name', 'pts', 'reb', 'assists', 'salary_usd']
-                    ].copy()
+                        ['player_name', 'player_id', 'team_name', 'pts', 'reb', 'assists', 'salary_usd', 'predicted_salary']
+                    ]
                     display_df['Headshot'] = display_df.apply(
                         lambda row: get_player_image_url(row['player_name'], row['player_id']), axis=1
                     )
                     display_df['salary_usd'] = display_df['salary_usd'].apply(lambda x: f"${x:,.0f}")
+                    display_df['predicted_salary'] = display_df['predicted_salary'].apply(lambda x: f"${x:,.0f}")
                     display_df = display_df[
-                        ['Headshot', 'player_name', 'team_name', 'pts', 'reb', 'assists', 'salary_usd']
+                        ['Headshot', 'player_name', 'team_name', 'pts', 'reb', 'assists', 'salary_usd', 'predicted_salary']
+                    ]
+                    display_df.columns = [
+                        'Headshot', 'Player', 'Team', 'Points', 'Rebounds', 'Assists', 'Salary', 'Predicted Salary'
                     ]
-                    display_df.columns = ['Headshot', 'Player', 'Team', 'Points', 'Rebounds', 'Assists', 'Salary']
 
                     st.dataframe(
                         display_df,
@@ -912,11 +3996,17 @@ elif page == "Player Search":
                     st.markdown("### 🖱️ Click a Player on the Chart")
                     st.caption("Use the scatter plot to select a player directly from the filtered results.")
 
-                    search_fig = px.scatter(
+                    search_x_range, search_y_range = scatter_zoom_window(
+                        filtered_df, 'dollars_per_point', 'pts', "Dollars per Point", "Points per Game", key="search_zoom"
+                    )
+                    search_fig, search_mode = build_lod_scatter(
                         filtered_df,
                         x='dollars_per_point',
                         y='pts',
+                        x_range=search_x_range,
+                        y_range=search_y_range,
                         color='team_name',
+                        custom_data=['player_name'],
                         hover_name='player_name',
                         hover_data={
                             'team_name': True,
@@ -934,13 +4024,15 @@ elif page == "Player Search":
                         title='Click a player to view quick info'
                     )
 
-                    search_fig.update_traces(customdata=filtered_df['player_name'])
                     search_fig.update_layout(height=500)
+                    mode_note = describe_scatter_mode(search_mode, len(filtered_df))
+                    if mode_note:
+                        st.caption(mode_note)
 
                     def on_player_click(trace, points, state):
-                        if points.point_inds:
+                        if points.point_inds and trace.customdata is not None:
                             idx = points.point_inds[0]
-                            st.session_state.plot_click_player = trace.customdata[idx]
+                            st.session_state.plot_click_player = trace.customdata[idx][0]
 
                     plot_kwargs = {"use_container_width": True}
                     if supports_plotly_click():
@@ -949,8 +4041,8 @@ elif page == "Player Search":
                     st.plotly_chart(search_fig, **plot_kwargs)
 
                     clicked_player = st.session_state.plot_click_player
-                    if clicked_player and clicked_player in filtered_df['player_name'].values:
-                        player_data = filtered_df[filtered_df['player_name'] == clicked_player].iloc[0]
+                    player_data = get_player_row(filtered_df, get_base_player_index(df), clicked_player) if clicked_player else None
+                    if player_data is not None:
                         team_colors = get_team_colors(player_data['team_name'])
 
                         st.markdown(f"""
@@ -961,6 +4053,7 @@ elif page == "Player Search":
                                         <h1 style='margin: 0; color: {team_colors["primary"]};'>{clicked_player}</h1>
                                         <h2 style='margin: 10px 0; color: #666;'>{player_data['team_name']}</h2>
                                         <h3 style='color: #4A90E2; margin: 5px 0;'>Salary: ${player_data['salary_usd']:,.0f}</h3>
+                                        <p style='margin: 0 0 5px; color: #555;'>Predicted Salary: ${player_data['predicted_salary']:,.0f}</p>
                                         <p style='margin: 0; color: #555;'>Points: {player_data['pts']:.1f} • Rebounds: {player_data['reb']:.1f} • Assists: {player_data['assists']:.1f}</p>
                                     </div>
                                 </div>
@@ -980,18 +4073,21 @@ elif page == "Analytics":
     if not data_loaded:
         st.error("Data not loaded. Please check your data file.")
     else:
+        df = with_salary_predictions(ensure_salary_efficiency_columns(df))
+
         st.markdown("### Filter by Team")
         teams_list = ['All Teams'] + sorted(df['team_name'].unique().tolist())
         selected_team_analytics = st.selectbox("Select Team to Display:", teams_list, key="analytics_team")
 
         if selected_team_analytics == 'All Teams':
-            plot_df = df.copy()
+            plot_df = df
         else:
-            plot_df = df[df['team_name'] == selected_team_analytics].copy()
+            plot_df = df[df['team_name'] == selected_team_analytics]
 
+        base_player_index = get_base_player_index(df)
         if (
             st.session_state.analytics_click_player
-            and st.session_state.analytics_click_player not in plot_df['player_name'].values
+            and get_player_row(plot_df, base_player_index, st.session_state.analytics_click_player) is None
         ):
             st.session_state.analytics_click_player = None
 
@@ -999,10 +4095,16 @@ elif page == "Analytics":
         st.markdown("### Dollars per Point vs Dollars per Game")
         st.caption("This scatter plot shows the relationship between salary efficiency metrics for NBA players.")
 
-        fig = px.scatter(
+        x_range, y_range = scatter_zoom_window(
+            plot_df, 'dollars_per_point', 'dollars_per_game', "Dollars per Point", "Dollars per Game", key="analytics_zoom"
+        )
+
+        fig, scatter_mode = build_lod_scatter(
             plot_df,
             x='dollars_per_point',
             y='dollars_per_game',
+            x_range=x_range,
+            y_range=y_range,
             custom_data=['player_name'],
             hover_name='player_name',
             hover_data={
@@ -1033,8 +4135,12 @@ elif page == "Analytics":
             font=dict(size=12)
         )
 
+        mode_note = describe_scatter_mode(scatter_mode, len(plot_df))
+        if mode_note:
+            st.caption(mode_note)
+
         def on_analytics_click(trace, points, state):
-            if points.point_inds:
+            if points.point_inds and trace.customdata is not None:
                 idx = points.point_inds[0]
                 st.session_state.analytics_click_player = trace.customdata[idx][0]
 
@@ -1045,8 +4151,8 @@ elif page == "Analytics":
         st.plotly_chart(fig, **plot_kwargs)
 
         clicked_player = st.session_state.analytics_click_player
-        if clicked_player and clicked_player in plot_df['player_name'].values:
-            player_row = plot_df[plot_df['player_name'] == clicked_player].iloc[0]
+        player_row = get_player_row(plot_df, base_player_index, clicked_player) if clicked_player else None
+        if player_row is not None:
             team_colors = get_team_colors(player_row['team_name'])
 
             st.markdown("#### Selected Player")
@@ -1059,12 +4165,37 @@ elif page == "Analytics":
                             <h4 style='margin: 8px 0; color: #666;'>{player_row['team_name']}</h4>
                             <p style='margin: 0; color: #4A90E2;'>Salary per Game: ${player_row['dollars_per_game']:,.2f}</p>
                             <p style='margin: 0; color: #4A90E2;'>Salary per Point: ${player_row['dollars_per_point']:,.2f}</p>
+                            <p style='margin: 0; color: #4A90E2;'>Salary: ${player_row['salary_usd']:,.0f} • Predicted: ${player_row['predicted_salary']:,.0f}</p>
                             <p style='margin: 10px 0 0; color: #555;'>PPG: {player_row['pts']:.1f} • RPG: {player_row['reb']:.1f} • APG: {player_row['assists']:.1f}</p>
                         </div>
                     </div>
                 </div>
             """, unsafe_allow_html=True)
 
+        st.markdown("---")
+        st.markdown("### 🤖 Predicted vs Actual Salary")
+        salary_model = get_base_salary_model(df)
+        st.caption(
+            f"Ridge regression on {', '.join(SALARY_MODEL_FEATURES)} (R² {salary_model['r2']:.2f}). "
+            "Points above the diagonal are paid more than the model predicts."
+        )
+        prediction_fig, prediction_mode = build_lod_scatter(
+            plot_df,
+            x='predicted_salary',
+            y='salary_usd',
+            color='team_name',
+            custom_data=['player_name'],
+            hover_name='player_name',
+            hover_data={'team_name': True, 'pts': ':.1f', 'salary_usd': ':$,.0f', 'predicted_salary': ':$,.0f'},
+            labels={'predicted_salary': 'Predicted Salary ($)', 'salary_usd': 'Actual Salary ($)', 'team_name': 'Team'},
+        )
+        salary_limit = float(max(plot_df['salary_usd'].max(), plot_df['predicted_salary'].max(), 0))
+        prediction_fig.add_shape(
+            type='line', x0=0, y0=0, x1=salary_limit, y1=salary_limit, line=dict(color='#7f8c8d', dash='dash')
+        )
+        prediction_fig.update_layout(height=500, xaxis_tickformat='$,.0f', yaxis_tickformat='$,.0f', showlegend=False)
+        st.plotly_chart(prediction_fig, use_container_width=True)
+
 
 # ============================================
 # TOP FEATURE - CONTRACT EFFICIENCY SCORE
@@ -1086,7 +4217,12 @@ elif page == "Contract Efficiency Score":
     if not data_loaded:
         st.error("Data not loaded. Please check your data file.")
     else:
-        contract_df = get_contract_records(df)
+        contract_store = get_contract_store(df)
+        contract_snapshot = get_contract_snapshot(df)
+        contract_df = contract_snapshot['records']
+        contract_leaderboards = contract_snapshot['leaderboards']
+        contract_player_index = contract_snapshot['player_index']
+        contract_status = st.container()
 
         st.markdown("### 🧮 How CES is calculated")
         st.info(
@@ -1102,12 +4238,10 @@ elif page == "Contract Efficiency Score":
             )
 
         with col2:
-            top_player = contract_df.loc[contract_df['contract_efficiency_score'].idxmax()]
-            st.metric(
-                "Top Value Player",
-                top_player['player_name'],
-                f"CES {top_player['contract_efficiency_score']:.2f}"
-            )
+            top_value = top_k(contract_leaderboards, 'contract_efficiency_score', 1)
+            if top_value:
+                top_name, top_ces, _ = top_value[0]
+                st.metric("Top Value Player", top_name, f"CES {top_ces:.2f}")
 
         with col3:
             value_counts = contract_df['contract_value_label'].value_counts()
@@ -1139,74 +4273,47 @@ elif page == "Contract Efficiency Score":
                 new_pts = st.number_input("Points per Game", min_value=0.0, step=0.1)
                 new_reb = st.number_input("Rebounds per Game", min_value=0.0, step=0.1)
                 new_ast = st.number_input("Assists per Game", min_value=0.0, step=0.1)
+                new_years = st.number_input(
+                    "Contract Years", min_value=0, max_value=10, value=DEFAULT_CONTRACT_YEARS, step=1
+                )
+                new_raise = st.number_input(
+                    "Annual Raise (%)", min_value=0.0, max_value=15.0, value=DEFAULT_ANNUAL_RAISE * 100, step=0.5
+                )
                 submitted_new = st.form_submit_button("Create Player Contract", use_container_width=True)
 
             if submitted_new:
                 if new_player.strip() == "":
                     st.warning("Please provide a player name before creating a contract.")
-                elif new_player in contract_df['player_name'].values:
+                elif new_player in contract_player_index['name_to_id']:
                     st.warning("Player already exists. Use the update panel to edit the contract.")
                 else:
-                    base_columns = contract_df.columns
-                    new_record = {col: 0 for col in base_columns}
-                    new_record.update({
-                        'player_name': new_player,
-                        'team_name': new_team,
-                        'salary_usd': new_salary,
-                        'pts': new_pts,
-                        'reb': new_reb,
-                        'assists': new_ast,
+                    submit_contract_mutation(contract_store, {
+                        'op': 'create',
+                        'record': {
+                            'player_name': new_player,
+                            'team_key': new_team,
+                            'team_name': new_team,
+                            'salary_usd': new_salary,
+                            'pts': new_pts,
+                            'reb': new_reb,
+                            'assists': new_ast,
+                            'contract_years': new_years,
+                            'annual_raise': new_raise / 100,
+                        },
                     })
-                    updated_df = pd.concat([contract_df, pd.DataFrame([new_record])], ignore_index=True)
-                    contract_df = persist_contract_records(updated_df)
-                    st.success(f"Added {new_player} and recalculated CES.")
+                    st.success(f"Added {new_player}; CES is recalculating.")
 
         with management_col2:
             st.subheader("Update or Delete")
-            selected_player = st.selectbox("Select Player", contract_df['player_name'].tolist())
-            selected_row = contract_df[contract_df['player_name'] == selected_player].iloc[0]
-
-            new_salary_slider = st.slider(
-                "Simulate Salary (What-if)",
-                min_value=0.0,
-                max_value=float(max(contract_df['salary_usd'].max(), selected_row['salary_usd'])),
-                value=float(selected_row['salary_usd']),
-                step=250000.0,
-                help="Adjust to see updated CES without committing changes",
-            )
-
-            simulated_row = simulate_ces_for_salary(selected_player, new_salary_slider, contract_df)
-            if simulated_row is not None:
-                st.info(
-                    f"Simulated CES: {simulated_row['contract_efficiency_score']:.2f} ({simulated_row['contract_value_label']})"
-                )
+            run_as_fragment(render_contract_editor)(contract_store, contract_df, contract_player_index)
 
-            with st.form("update_contract_form"):
-                upd_salary = st.number_input("Salary (USD)", value=float(selected_row['salary_usd']), step=250000.0)
-                upd_pts = st.number_input("Points per Game", value=float(selected_row['pts']), step=0.1)
-                upd_reb = st.number_input("Rebounds per Game", value=float(selected_row['reb']), step=0.1)
-                upd_ast = st.number_input("Assists per Game", value=float(selected_row['assists']), step=0.1)
-                update_btn, delete_btn = st.columns(2)
-                with update_btn:
-                    submitted_update = st.form_submit_button("Update", use_container_width=True)
-                with delete_btn:
-                    submitted_delete = st.form_submit_button("Delete", use_container_width=True)
-
-            if submitted_update:
-                contract_df.loc[contract_df['player_name'] == selected_player, ['salary_usd', 'pts', 'reb', 'assists']] = [
-                    upd_salary,
-                    upd_pts,
-                    upd_reb,
-                    upd_ast,
-                ]
-                contract_df = persist_contract_records(contract_df)
-                st.success(f"Updated {selected_player} and recalculated CES.")
-
-            if submitted_delete:
-                contract_df = persist_contract_records(
-                    contract_df[contract_df['player_name'] != selected_player].reset_index(drop=True)
+        with contract_status:
+            if is_contract_store_busy(contract_store) and hasattr(st, 'fragment'):
+                st.fragment(render_contract_status, run_every=CONTRACT_STATUS_POLL_SECONDS)(
+                    contract_store, contract_snapshot['version']
                 )
-                st.success(f"Deleted {selected_player} and refreshed the leaderboard.")
+            else:
+                render_contract_status(contract_store, contract_snapshot['version'])
 
         st.markdown("---")
         st.markdown("### 🧭 CES Classifications")
@@ -1224,57 +4331,134 @@ elif page == "Contract Efficiency Score":
                 unsafe_allow_html=True
             )
 
-        st.markdown("### 💰 Team Salary Cap Snapshot")
-        cap_df = contract_df.groupby('team_name', as_index=False)['salary_usd'].sum().rename(columns={'salary_usd': 'team_salary_total'})
-        cap_df = cap_df.sort_values('team_salary_total', ascending=False)
+        st.markdown("### ⚖️ Fair Salary by Player")
+        st.caption(
+            "Highest salary at which each player still rates Fair or Underpaid, accounting for how their own CES "
+            "moves the percentile cutoffs. Overpaid players show the pay cut needed to reach Fair."
+        )
+        fair_salaries = cached_call(solve_fair_salaries, contract_df)
+        fair_team = st.selectbox(
+            "Team", ['All Teams'] + sorted(contract_df['team_name'].dropna().unique().tolist()), key="fair_salary_team"
+        )
+        if fair_team != 'All Teams':
+            fair_salaries = fair_salaries[fair_salaries['team_name'] == fair_team]
         st.dataframe(
-            cap_df,
+            fair_salaries.sort_values('change_to_fair').rename(columns={
+                'player_name': 'Player',
+                'team_name': 'Team',
+                'salary_usd': 'Salary (USD)',
+                'contract_efficiency_score': 'CES',
+                'contract_value_label': 'Value Label',
+                'fair_salary_ceiling': 'Fair Up To (USD)',
+                'underpaid_salary_ceiling': 'Underpaid Up To (USD)',
+                'change_to_fair': 'Change to Fair (USD)',
+            }),
             use_container_width=True,
-            height=300,
+            hide_index=True,
             column_config={
-                'team_salary_total': st.column_config.NumberColumn("Team Salary Total", format="$%,d"),
-                'team_name': st.column_config.TextColumn("Team"),
+                "Salary (USD)": st.column_config.NumberColumn(format="$%,d"),
+                "CES": st.column_config.NumberColumn(format="%.2f"),
+                "Fair Up To (USD)": st.column_config.NumberColumn(format="$%,d"),
+                "Underpaid Up To (USD)": st.column_config.NumberColumn(format="$%,d"),
+                "Change to Fair (USD)": st.column_config.NumberColumn(format="$%,d"),
             },
+            height=400,
         )
 
+        st.markdown("### 💰 Team Salary Cap Snapshot")
+        cap_df = cached_call(build_team_totals, contract_df)['salary_usd'].rename('team_salary_total').reset_index()
+        cap_col1, cap_col2 = st.columns([3, 1])
+        with cap_col2:
+            cap_page = render_page_controls(len(cap_df), 10, key="cap_snapshot_page")
+        cap_page_df, _, _, _ = paginate_frame(cap_df, 'team_salary_total', ascending=False, page=cap_page, page_size=10)
+        with cap_col1:
+            st.dataframe(
+                cap_page_df,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    'team_salary_total': st.column_config.NumberColumn("Team Salary Total", format="$%,d"),
+                    'team_name': st.column_config.TextColumn("Team"),
+                },
+            )
+        cap_export = cached_call(build_team_cap_table, contract_df).rename_axis('team_name').reset_index()
+        render_export_buttons(lambda: iter_frame_chunks(cap_export), "team_cap_snapshot", key="cap_export")
+
         st.markdown("---")
         st.markdown("### 📋 CES Leaderboard (Best to Worst Value)")
 
-        display_cols = [
-            'player_name',
-            'team_name',
-            'contract_efficiency_score',
-            'contract_value_label',
-            'salary_usd',
-            'pts',
-            'reb',
-            'assists',
-        ]
+        sort_labels = {label: col for col, label in CES_LEADERBOARD_COLUMNS.items()}
 
-        leaderboard_df = contract_df[display_cols].sort_values(
-            by='contract_efficiency_score', ascending=False
+        control_cols = st.columns(5)
+        with control_cols[0]:
+            sort_label = st.selectbox("Sort by", list(sort_labels), key="ces_sort_by")
+        with control_cols[1]:
+            sort_order = st.selectbox("Order", ["Descending", "Ascending"], key="ces_sort_order")
+        with control_cols[2]:
+            team_filter = st.selectbox(
+                "Team", ['All Teams'] + sorted(contract_df['team_name'].dropna().unique().tolist()), key="ces_team_filter"
+            )
+        with control_cols[3]:
+            tier_filter = st.selectbox("Value Label", ['All Labels', 'Underpaid', 'Fair', 'Overpaid'], key="ces_tier_filter")
+        with control_cols[4]:
+            page_size = st.selectbox("Rows per page", LEADERBOARD_PAGE_SIZES, key="ces_page_size")
+
+        leaderboard_page = st.session_state.get("ces_page", 1)
+        leaderboard_df, total_rows, total_pages, leaderboard_page = get_leaderboard_page(
+            contract_df,
+            contract_leaderboards,
+            sort_by=sort_labels[sort_label],
+            ascending=sort_order == "Ascending",
+            team=None if team_filter == 'All Teams' else team_filter,
+            tier=None if tier_filter == 'All Labels' else tier_filter,
+            page=leaderboard_page,
+            page_size=page_size,
         )
-        leaderboard_df = leaderboard_df.rename(columns={
-            'player_name': 'Player',
-            'team_name': 'Team',
-            'contract_efficiency_score': 'CES',
-            'contract_value_label': 'Value Label',
-            'salary_usd': 'Salary (USD)',
-            'pts': 'PTS',
-            'reb': 'REB',
-            'assists': 'AST',
-        })
+        leaderboard_df = leaderboard_df[list(CES_LEADERBOARD_COLUMNS)].rename(columns=CES_LEADERBOARD_COLUMNS)
 
         st.dataframe(
             leaderboard_df,
             use_container_width=True,
+            hide_index=True,
             column_config={
                 "Salary (USD)": st.column_config.NumberColumn(format="$%,d"),
+                "Predicted Salary (USD)": st.column_config.NumberColumn(format="$%,d"),
                 "CES": st.column_config.NumberColumn(format="%.2f"),
             },
-            height=500,
+            height=min(500, 38 + 35 * max(len(leaderboard_df), 1)),
+        )
+
+        page_col1, page_col2 = st.columns([1, 3])
+        with page_col1:
+            render_page_controls(total_rows, page_size, key="ces_page")
+        with page_col2:
+            first_row = (leaderboard_page - 1) * page_size + 1 if total_rows else 0
+            last_row = min(leaderboard_page * page_size, total_rows)
+            st.caption(f"Showing {first_row:,}–{last_row:,} of {total_rows:,} contracts • page {leaderboard_page} of {total_pages}")
+
+        export_sort = sort_labels[sort_label]
+        export_team = None if team_filter == 'All Teams' else team_filter
+        export_tier = None if tier_filter == 'All Labels' else tier_filter
+        st.caption("Export every contract matching the filters, in the current order:")
+        render_export_buttons(
+            lambda: iter_leaderboard_chunks(
+                contract_df,
+                contract_leaderboards,
+                export_sort,
+                ascending=sort_order == "Ascending",
+                team=export_team,
+                tier=export_tier,
+            ),
+            "ces_leaderboard",
+            key="ces_export",
+            columns=CES_LEADERBOARD_COLUMNS,
         )
 
+        st.markdown("---")
+        st.markdown("### 🤝 Comparable Contracts")
+        st.caption("Nearest players in the normalized points/rebounds/assists space CES is built on, with their salaries.")
+        run_as_fragment(render_comps_panel)(contract_snapshot)
+
 
 # ============================================
 # TRADE APPROVAL & SALARY CAP VALIDATION
@@ -1286,119 +4470,97 @@ elif page == "Trade Approval":
     if not data_loaded:
         st.error("Data not loaded. Please check your data file.")
     else:
+        if 'trade_store' not in st.session_state:
+            st.session_state.trade_store = new_trade_store()
+        trade_store = st.session_state.trade_store
         contract_df = get_contract_records(df)
         teams_list = sorted(contract_df['team_name'].dropna().unique().tolist())
 
+        cap_rules = cap_rules_for(contract_df)
         st.info(
-            f"This workspace recalculates salary cap space, luxury tax exposure, and Contract Efficiency Score (CES) instantly."
-            f" Salary Cap: ${SALARY_CAP:,.0f} • Luxury Tax: ${LUXURY_TAX_THRESHOLD:,.0f}"
+            f"This workspace recalculates salary cap space, luxury tax bills, and Contract Efficiency Score (CES) instantly."
+            f" Salary Cap: ${cap_rules['salary_cap']:,.0f} • Luxury Tax: ${cap_rules['tax_line']:,.0f}"
+            f" • First Apron: ${cap_rules['first_apron']:,.0f} • Second Apron: ${cap_rules['second_apron']:,.0f}"
         )
 
-        st.markdown("### Propose a New Trade")
-        proposal_title = st.text_input(
-            "Trade Name", value=f"Trade {st.session_state.trade_counter}", key="trade_title"
-        )
+        run_as_fragment(render_trade_builder)(trade_store, contract_df, teams_list)
 
-        col_a, col_b = st.columns(2)
-        with col_a:
-            team_a = st.selectbox("Team A", teams_list, key="trade_team_a")
-            outgoing_a = st.multiselect(
-                "Players sent to Team B",
-                options=get_team_players(contract_df, team_a),
-                key="trade_out_a",
+        st.markdown("---")
+        st.markdown("### 📈 League Cap Projection")
+        projection_col1, projection_col2 = st.columns(2)
+        with projection_col1:
+            projection_seasons = st.slider(
+                "Seasons to project", 2, 8, PROJECTION_SEASONS, key="projection_seasons"
             )
-
-        with col_b:
-            team_b = st.selectbox("Team B", teams_list, key="trade_team_b")
-            outgoing_b = st.multiselect(
-                "Players sent to Team A",
-                options=get_team_players(contract_df, team_b),
-                key="trade_out_b",
+        with projection_col2:
+            cap_growth_pct = st.slider(
+                "Annual cap growth (%)", 0.0, 10.0, DEFAULT_CAP_GROWTH * 100, step=0.5, key="projection_cap_growth"
             )
+        league_projection = cached_call(project_team_payrolls, contract_df, projection_seasons, cap_growth_pct / 100)
+        cap_space_fig = px.imshow(
+            league_projection['cap_space'],
+            x=league_projection['seasons'],
+            y=league_projection['teams'],
+            color_continuous_scale='RdYlGn',
+            color_continuous_midpoint=0,
+            aspect='auto',
+            labels={'x': 'Season', 'y': 'Team', 'color': 'Cap Space ($)'},
+        )
+        cap_space_fig.update_layout(height=700, margin=dict(t=30))
+        st.plotly_chart(cap_space_fig, use_container_width=True)
+        taxed_teams = int((league_projection['tax_exposure'][:, 0] > 0).sum())
+        st.caption(
+            f"{taxed_teams} teams are over the luxury tax this season, owing "
+            f"${league_projection['tax_bill'][:, 0].sum():,.0f} in total. Expiring contracts drop off in later seasons, "
+            "so cap space grows unless new deals are added."
+        )
 
-        trade_preview = evaluate_trade(team_a, team_b, outgoing_a, outgoing_b, contract_df)
-
-        if trade_preview['errors']:
-            for err in trade_preview['errors']:
-                st.warning(f"⚠️ {err}")
-
-        if trade_preview['violations']:
-            for msg in trade_preview['violations']:
-                st.error(f"🚫 {msg}")
-
-        st.markdown("#### Cap & CES Impact Preview")
-        preview_col1, preview_col2 = st.columns(2)
-        for col, key in zip([preview_col1, preview_col2], ['team_a', 'team_b']):
-            team_result = trade_preview['team_results'].get(key)
-            if team_result and team_result['team']:
-                with col:
-                    st.markdown(f"**{team_result['team']}** — {team_result['status']}")
-                    st.metric(
-                        "Post-Trade Salary",
-                        f"${team_result['salary_post']:,.0f}",
-                        delta=f"${team_result['salary_delta']:,.0f}",
-                    )
-                    st.metric(
-                        "Cap Space After",
-                        f"${team_result['cap_space_post']:,.0f}",
-                        delta=f"${team_result['cap_space_post'] - team_result['cap_space_pre']:,.0f}",
-                    )
-                    st.metric(
-                        "Team CES",
-                        f"{team_result['ces_post']:.2f}",
-                        delta=f"{team_result['ces_delta']:.2f}",
-                    )
-                    st.caption(
-                        f"Luxury Tax Exposure: ${team_result['luxury_post']:,.0f} | "
-                        f"Outgoing Salary: ${trade_preview['outgoing_a_salary' if key == 'team_a' else 'outgoing_b_salary']:,.0f}"
-                    )
-
-        if st.button("💾 Save Trade Proposal", type="primary"):
-            if trade_preview['errors']:
-                st.error("Cannot save trade with validation errors.")
-            else:
-                new_trade = {
-                    'id': st.session_state.trade_counter,
-                    'title': proposal_title.strip() or f"Trade {st.session_state.trade_counter}",
-                    'team_a': team_a,
-                    'team_b': team_b,
-                    'outgoing_a': outgoing_a,
-                    'outgoing_b': outgoing_b,
-                }
-                st.session_state.trade_proposals.append(new_trade)
-                st.session_state.trade_counter += 1
-                st.success(f"Saved {new_trade['title']} with live cap validation.")
+        st.markdown("#### 🧾 Cap Position by Team")
+        cap_table = cached_call(build_team_cap_table, contract_df)
+        st.dataframe(
+            cap_table[['payroll', 'cap_space', 'tax_bill', 'status', 'repeater']]
+            .sort_values('payroll', ascending=False)
+            .rename(columns={
+                'payroll': 'Payroll (USD)',
+                'cap_space': 'Cap Space (USD)',
+                'tax_bill': 'Tax Bill (USD)',
+                'status': 'Cap Status',
+                'repeater': 'Repeat Taxpayer',
+            }),
+            use_container_width=True,
+            column_config={
+                column: st.column_config.NumberColumn(format="$%,d")
+                for column in ['Payroll (USD)', 'Cap Space (USD)', 'Tax Bill (USD)']
+            },
+        )
 
         st.markdown("---")
         st.markdown("### Manage Trade Proposals (CRUD)")
 
-        if not st.session_state.trade_proposals:
+        if not trade_store['records']:
             st.info("No trade proposals yet. Create one above to begin tracking.")
         else:
-            proposal_options = {
-                f"{trade['title']} — {trade['team_a']} ↔ {trade['team_b']}": trade['id']
-                for trade in st.session_state.trade_proposals
-            }
+            proposal_teams = sorted(team for team, trade_ids in trade_store['by_team'].items() if trade_ids)
+            proposal_team_filter = st.selectbox(
+                "Show proposals involving", ['All Teams'] + proposal_teams, key="trade_team_filter"
+            )
+            if proposal_team_filter == 'All Teams':
+                proposal_ids = list(trade_store['records'])
+            else:
+                proposal_ids = sorted(trade_store['by_team'].get(proposal_team_filter, set()))
+
             selected_trade_id = st.selectbox(
                 "Select a proposal to review or update",
-                options=list(proposal_options.values()),
-                format_func=lambda tid: [label for label, pid in proposal_options.items() if pid == tid][0],
+                options=proposal_ids,
+                format_func=lambda tid: trade_store['labels'][tid],
                 key="trade_select",
             )
 
-            selected_trade = next(
-                (trade for trade in st.session_state.trade_proposals if trade['id'] == selected_trade_id), None
-            )
+            selected_trade = trade_store['records'].get(selected_trade_id)
 
             if selected_trade:
                 st.markdown(f"#### {selected_trade['title']}")
-                evaluation = evaluate_trade(
-                    selected_trade['team_a'],
-                    selected_trade['team_b'],
-                    selected_trade['outgoing_a'],
-                    selected_trade['outgoing_b'],
-                    contract_df,
-                )
+                evaluation = evaluate_trade_proposal(trade_store, selected_trade_id, contract_df)
 
                 col_summary_a, col_summary_b = st.columns(2)
                 for col, key in zip([col_summary_a, col_summary_b], ['team_a', 'team_b']):
@@ -1422,7 +4584,7 @@ elif page == "Trade Approval":
                                 delta=f"{team_result['ces_delta']:.2f}",
                             )
                             st.caption(
-                                f"Luxury Tax Exposure: ${team_result['luxury_post']:,.0f}"
+                                f"Luxury Tax Bill: ${team_result['luxury_post']:,.0f}"
                             )
 
                 st.markdown("##### Edit Proposal")
@@ -1440,7 +4602,7 @@ elif page == "Trade Approval":
                     edit_outgoing_a = st.multiselect(
                         "Edit players sent by Team A",
                         options=get_team_players(contract_df, edit_team_a),
-                        default=selected_trade['outgoing_a'],
+                        default=list(selected_trade['outgoing_a']),
                         key=f"edit_out_a_{selected_trade_id}",
                     )
 
@@ -1454,7 +4616,7 @@ elif page == "Trade Approval":
                     edit_outgoing_b = st.multiselect(
                         "Edit players sent by Team B",
                         options=get_team_players(contract_df, edit_team_b),
-                        default=selected_trade['outgoing_b'],
+                        default=list(selected_trade['outgoing_b']),
                         key=f"edit_out_b_{selected_trade_id}",
                     )
 
@@ -1463,39 +4625,120 @@ elif page == "Trade Approval":
                     if updated['errors']:
                         st.error("Cannot update proposal due to validation errors.")
                     else:
-                        selected_trade.update(
-                            {
-                                'title': edit_title.strip() or selected_trade['title'],
-                                'team_a': edit_team_a,
-                                'team_b': edit_team_b,
-                                'outgoing_a': edit_outgoing_a,
-                                'outgoing_b': edit_outgoing_b,
-                            }
+                        update_trade_proposal(
+                            trade_store,
+                            selected_trade_id,
+                            title=edit_title.strip() or selected_trade['title'],
+                            team_a=edit_team_a,
+                            team_b=edit_team_b,
+                            outgoing_a=edit_outgoing_a,
+                            outgoing_b=edit_outgoing_b,
                         )
                         st.success("Proposal updated and revalidated.")
 
                 if st.button("🗑️ Delete Proposal", key=f"delete_trade_{selected_trade_id}"):
-                    st.session_state.trade_proposals = [
-                        trade for trade in st.session_state.trade_proposals if trade['id'] != selected_trade_id
-                    ]
+                    delete_trade_proposal(trade_store, selected_trade_id)
                     st.success("Proposal deleted.")
 
-            summary_rows = []
-            for trade in st.session_state.trade_proposals:
-                result = evaluate_trade(
-                    trade['team_a'], trade['team_b'], trade['outgoing_a'], trade['outgoing_b'], contract_df
-                )
-                summary_rows.append(
-                    {
-                        'Trade': trade['title'],
-                        'Teams': f"{trade['team_a']} ↔ {trade['team_b']}",
-                        'Status': "; ".join(result['violations']) if result['violations'] else "Cap Compliant",
-                        'Team A Salary After': result['team_results']['team_a']['salary_post'],
-                        'Team B Salary After': result['team_results']['team_b']['salary_post'],
-                    }
-                )
+            st.dataframe(get_trade_summary(trade_store, contract_df), use_container_width=True)
+            trade_export = build_trade_export(trade_store, contract_df)
+            render_export_buttons(lambda: iter_frame_chunks(trade_export), "trade_proposals", key="trade_export")
+
+# ============================================
+# BUDGET OPTIMIZER
+# ============================================
+elif page == "Budget Optimizer":
+    st.markdown("# 🧮 Free-Agent Budget Optimizer")
+    st.markdown("---")
+
+    if not data_loaded:
+        st.error("Data not loaded. Please check your data file.")
+    else:
+        contract_df = get_contract_records(df)
+        teams_list = sorted(contract_df['team_name'].dropna().unique().tolist())
+        cap_rules = cap_rules_for(contract_df)
+
+        st.info(
+            "Pick the signings that add the most value without pushing payroll past the chosen cap line. "
+            "Every player on another roster is treated as available at the asking salary."
+        )
+
+        opt_col1, opt_col2, opt_col3 = st.columns(3)
+        with opt_col1:
+            optimizer_team = st.selectbox("Team", teams_list, key="optimizer_team")
+            objective_label = st.selectbox("Maximize", list(OPTIMIZER_OBJECTIVES), key="optimizer_objective")
+        with opt_col2:
+            budget_label = st.selectbox(
+                "Stay under", list(OPTIMIZER_BUDGET_LINES), index=1, key="optimizer_budget_line"
+            )
+            asking_label = st.selectbox("Asking salary", list(OPTIMIZER_ASKING_COLUMNS), key="optimizer_asking")
+        with opt_col3:
+            open_spots = st.slider("Open roster spots", 1, 8, 3, key="optimizer_spots")
+
+        plan = cached_call(
+            plan_team_signings,
+            contract_df,
+            optimizer_team,
+            OPTIMIZER_OBJECTIVES[objective_label],
+            OPTIMIZER_BUDGET_LINES[budget_label],
+            open_spots,
+            OPTIMIZER_ASKING_COLUMNS[asking_label],
+        )
+        roster_size = len(get_team_players(contract_df, optimizer_team))
+
+        metric_col1, metric_col2, metric_col3 = st.columns(3)
+        with metric_col1:
+            st.metric("Current Payroll", f"${plan['payroll']:,.0f}", help=f"{roster_size} players on the roster")
+        with metric_col2:
+            st.metric(f"Room Under {budget_label}", f"${max(plan['budget'], 0):,.0f}")
+        with metric_col3:
+            signing_spend = plan['signings'][OPTIMIZER_ASKING_COLUMNS[asking_label]].sum()
+            st.metric("Planned Spend", f"${signing_spend:,.0f}")
+
+        if plan['budget'] <= 0:
+            st.warning(
+                f"{optimizer_team} is already above the {budget_label.lower()} "
+                f"(${cap_rules[OPTIMIZER_BUDGET_LINES[budget_label]]:,.0f}); there is no room to sign anyone."
+            )
+        elif plan['signings'].empty:
+            st.warning("No available player fits under the budget with a positive value.")
+        else:
+            st.markdown("#### ✅ Optimal Signings")
+            st.dataframe(
+                plan['signings'].rename(columns={
+                    'player_name': 'Player',
+                    'team_name': 'Current Team',
+                    'salary_usd': 'Salary (USD)',
+                    'predicted_salary': 'Predicted Salary (USD)',
+                    'contract_efficiency_score': 'CES',
+                    'pts': 'PTS',
+                    'reb': 'REB',
+                    'assists': 'AST',
+                }),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Salary (USD)": st.column_config.NumberColumn(format="$%,d"),
+                    "Predicted Salary (USD)": st.column_config.NumberColumn(format="$%,d"),
+                },
+            )
 
-            st.dataframe(pd.DataFrame(summary_rows), use_container_width=True)
+            st.markdown("#### 📉 Spend vs Value Frontier")
+            frontier_fig = px.line(
+                plan['frontier'],
+                x='spend',
+                y='value',
+                markers=True,
+                hover_data=['signings', 'players'],
+                labels={'spend': 'Spend ($)', 'value': objective_label, 'signings': 'Signings', 'players': 'Players'},
+                line_shape='hv',
+            )
+            frontier_fig.update_layout(height=400, xaxis_tickformat='$,.0f', margin=dict(t=30))
+            st.plotly_chart(frontier_fig, use_container_width=True)
+            st.caption(
+                f"Each point is the most {objective_label.lower()} reachable for that spend with at most {open_spots} "
+                f"signings; asking salaries are rounded up to ${OPTIMIZER_SALARY_STEP:,} for the search."
+            )
 
 
 # ============================================
@@ -1525,6 +4768,12 @@ if page == "LLM Chat":
                 - "What is the average salary?"
                 - "What is the average points per player?"
                 - "Which team has the highest average points?"
+                - "Underpaid players with over 15 points"
+                - "Total payroll by team"
+                - "Top 10 rebounders with at least 60 games"
+                - "How many BOS players are paid over $10M?"
+                - "Who has the most assists on the Warriors?"
+                - "Players with salary between 10 and 20 million"
                 """)
 
             user_query = st.text_input("Enter your question:", placeholder="e.g., Show me the top 10 scorers")
@@ -1534,85 +4783,30 @@ if page == "LLM Chat":
                 submit_query = st.button("🚀 Submit", type="primary")
             with col2:
                 if st.button("🗑️ Clear History"):
-                    st.session_state.chat_history = []
+                    clear_chat_history(st.session_state.chat_history)
                     st.rerun()
 
             if submit_query and user_query:
-                st.session_state.chat_history.append({
-                    'role': 'user',
-                    'content': user_query,
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                })
+                append_chat_message(st.session_state.chat_history, 'user', user_query)
 
                 result_df, sql_query = execute_natural_language_query(user_query, df)
 
                 if result_df is not None:
                     response = f"Here are the results for your query:\n\n**Generated SQL:** `{sql_query}`"
-                    st.session_state.chat_history.append({
-                        'role': 'assistant',
-                        'content': response,
-                        'data': result_df,
-                        'timestamp': datetime.now().strftime('%H:%M:%S')
-                    })
+                    append_chat_message(st.session_state.chat_history, 'assistant', response, data=result_df)
                 else:
-                    error_response = f"❌ {sql_query}"
-                    st.session_state.chat_history.append({
-                        'role': 'assistant',
-                        'content': error_response,
-                        'timestamp': datetime.now().strftime('%H:%M:%S')
-                    })
+                    append_chat_message(st.session_state.chat_history, 'assistant', f"❌ {sql_query}")
 
             st.markdown("---")
             st.markdown("### 💬 Conversation History")
+            st.caption(
+                f"Keeps the last {CHAT_HISTORY_MAX_MESSAGES} messages; results older than the latest "
+                f"{CHAT_EAGER_MESSAGES} messages load when you switch them on."
+            )
 
-            for msg in st.session_state.chat_history:
-                if msg['role'] == 'user':
-                    st.markdown(f"""
-                        <div class='chat-message user-message'>
-                            <strong>You ({msg['timestamp']}):</strong><br>{msg['content']}
-                        </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                        <div class='chat-message assistant-message'>
-                            <strong>Assistant ({msg['timestamp']}):</strong><br>{msg['content']}
-                        </div>
-                    """, unsafe_allow_html=True)
-
-                    if 'data' in msg and msg['data'] is not None:
-                        result_df = msg['data']
-                        st.dataframe(result_df, use_container_width=True)
-
-                        # 🏀 Show player headshots if the result has player_name
-                        if 'player_name' in result_df.columns:
-                            players = (
-                                result_df['player_name']
-                                .dropna()
-                                .astype(str)
-                                .unique()[:3]  # show first 3 players
-                            )
-
-                            if len(players) > 0:
-                                st.markdown("#### 🏀 Players in this result")
-                                cols = st.columns(len(players))
-                                for col, name in zip(cols, players):
-                                    player_id = None
-                                    if 'player_id' in result_df.columns:
-                                        matching_ids = result_df.loc[
-                                            result_df['player_name'] == name, 'player_id'
-                                        ]
-                                        if not matching_ids.empty:
-                                            player_id = matching_ids.iloc[0]
-
-                                    if player_id is None:
-                                        player_id = PLAYER_ID_MAP.get(name)
-
-                                    with col:
-                                        st.image(
-                                            get_player_image_url(name, player_id),
-                                            caption=name,
-                                            use_column_width=True
-                                        )
+            chat_history = st.session_state.chat_history
+            for position, msg in enumerate(chat_history):
+                render_chat_message(msg, eager=position >= len(chat_history) - CHAT_EAGER_MESSAGES)
 
         with rag_tab:
             st.subheader("Retrieval-Augmented Generation")
@@ -1622,20 +4816,17 @@ if page == "LLM Chat":
                 "similarity before the response is generated."
             )
 
-            if 'rag_documents' not in st.session_state:
-                docs = build_rag_documents(df)
-                st.session_state.rag_documents = docs
-                st.session_state.rag_index = build_vector_index(docs)
+            rag_documents, rag_index = get_base_rag_index(df)
 
             st.info(
                 "**Vector DB (Chroma-style) setup**\n"
-                "- Storage: in-memory index scoped to this Streamlit session.\n"
+                "- Storage: in-memory index built once per dataset version and shared by every session.\n"
                 "- Embeddings: simple bag-of-words vectors to keep things lightweight for demos.\n"
                 "- Similarity: cosine similarity selects the top-k documents before composing a response."
             )
 
             with st.expander("📚 Indexed knowledge base"):
-                for doc in st.session_state.rag_documents:
+                for doc in rag_documents:
                     st.markdown(f"**{doc['title']}** — {doc['text']}")
 
             rag_query = st.text_input(
@@ -1645,7 +4836,7 @@ if page == "LLM Chat":
             rag_submit = st.button("🔎 Retrieve & Generate", key="rag_submit")
 
             if rag_submit and rag_query:
-                retrieved = retrieve_documents(rag_query, st.session_state.rag_index)
+                retrieved = retrieve_documents(rag_query, rag_index)
                 response = generate_rag_response(rag_query, retrieved)
 
                 st.markdown("#### Retrieved context")
@@ -1657,6 +4848,140 @@ if page == "LLM Chat":
                 st.markdown("#### Generated response")
                 st.write(response)
 
+# ============================================
+# MEMORY USAGE
+# ============================================
+elif page == "Memory Usage":
+    st.markdown("# 🧠 Session Memory Usage")
+    st.markdown("---")
+    st.caption(
+        "Deep size of every session-state entry for this tab and for every other session served by this process."
+    )
+
+    registry = get_session_registry()
+    current_session_id = get_current_session_id()
+    memory_df = collect_session_memory(registry)
+
+    if memory_df.empty:
+        st.info("No active sessions are registered yet.")
+    else:
+        memory_df['Size'] = memory_df['bytes'].apply(format_bytes)
+        memory_df['session'] = memory_df['session_id'].str[:8]
+        current_df = memory_df[memory_df['session_id'] == current_session_id]
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("This Session", format_bytes(current_df['bytes'].sum()))
+        with col2:
+            st.metric(
+                "All Sessions",
+                format_bytes(memory_df['bytes'].sum()),
+                help="Sum of entry sizes; objects shared between sessions are counted once per session",
+            )
+        with col3:
+            st.metric("Open Sessions", f"{memory_df['session_id'].nunique()}")
+
+        st.markdown("### 📦 This Session")
+        st.dataframe(
+            current_df.sort_values('bytes', ascending=False)[['key', 'type', 'Size']],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        st.markdown("### 🌐 Sessions in This Process")
+        session_df = (
+            memory_df.groupby(['session_id', 'session'], as_index=False)
+            .agg(entries=('key', 'count'), bytes=('bytes', 'sum'), idle_seconds=('idle_seconds', 'first'))
+            .sort_values('bytes', ascending=False)
+        )
+        session_df['Size'] = session_df['bytes'].apply(format_bytes)
+        session_df['Idle (min)'] = (session_df['idle_seconds'] / 60).round(1)
+        st.dataframe(
+            session_df[['session', 'entries', 'Size', 'Idle (min)']],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        st.markdown("### 🐘 Largest Offenders")
+        st.dataframe(
+            memory_df.nlargest(10, 'bytes')[['session', 'key', 'type', 'Size']],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        st.markdown("### 🧹 Evict Idle Sessions")
+        st.caption(
+            "Drops heavy objects from sessions that have been idle longer than the threshold. "
+            "Evicted contract records are rebuilt from the base dataset on the next visit, without that session's edits; "
+            "evicted chat history keeps its text but loses its result tables. Saved trade proposals are never evicted."
+        )
+        evict_col1, evict_col2 = st.columns(2)
+        with evict_col1:
+            idle_minutes = st.number_input("Idle for at least (minutes)", min_value=0.0, value=30.0, step=5.0)
+        with evict_col2:
+            evict_keys = st.multiselect(
+                "Entries to evict",
+                options=HEAVY_SESSION_KEYS,
+                default=['chat_history'],
+                help="Evicting contract records discards contract edits in those sessions; evicting chat history removes its result tables",
+            )
+
+        if st.button("🧹 Evict Heavy Objects", type="primary"):
+            evicted = evict_idle_sessions(registry, idle_minutes * 60, evict_keys, current_session_id)
+            st.success(f"Evicted {evicted} entries from idle sessions.")
+
+    st.markdown("### 🗄️ Derived Data Cache")
+    derived_cache = get_derived_cache()
+    with derived_cache['lock']:
+        cache_rows = [
+            {'Kind': key[0] if isinstance(key, tuple) else str(key), 'bytes': derived_cache['sizes'][key]}
+            for key in derived_cache['entries']
+        ]
+        cache_lookups = derived_cache['hits'] + derived_cache['misses']
+        cache_col1, cache_col2, cache_col3, cache_col4 = st.columns(4)
+        with cache_col1:
+            st.metric("Entries", f"{len(cache_rows)} / {DERIVED_CACHE_MAX_ENTRIES}")
+        with cache_col2:
+            st.metric("Size", format_bytes(derived_cache['bytes']), help=f"Bound: {format_bytes(DERIVED_CACHE_MAX_BYTES)}")
+        with cache_col3:
+            st.metric("Hit Rate", f"{derived_cache['hits'] / cache_lookups:.0%}" if cache_lookups else "N/A")
+        with cache_col4:
+            st.metric("Evictions", f"{derived_cache['evictions']:,}")
+    if cache_rows:
+        cache_df = pd.DataFrame(cache_rows).groupby('Kind', as_index=False).agg(entries=('bytes', 'size'), bytes=('bytes', 'sum'))
+        cache_df['Size'] = cache_df['bytes'].apply(format_bytes)
+        st.dataframe(
+            cache_df.sort_values('bytes', ascending=False)[['Kind', 'entries', 'Size']],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    if data_loaded:
+        st.markdown("### 📐 Dataset Schema")
+        memory_report = get_load_reports().get(df.attrs.get('data_version'))
+        if df.attrs.get('prepared_dataset'):
+            st.info(
+                f"Memory-mapped read-only from {df.attrs['prepared_dataset']}; app processes share one copy through the OS page cache."
+            )
+        elif memory_report is None:
+            st.info("The schema report is recorded when the dataset is loaded; restart the app to regenerate it.")
+        else:
+            bytes_before = memory_report['bytes_before'].sum()
+            bytes_after = memory_report['bytes_after'].sum()
+            schema_col1, schema_col2, schema_col3 = st.columns(3)
+            with schema_col1:
+                st.metric("Before Schema", format_bytes(bytes_before))
+            with schema_col2:
+                st.metric("After Schema", format_bytes(bytes_after))
+            with schema_col3:
+                st.metric("Reduction", f"{1 - bytes_after / bytes_before:.0%}" if bytes_before else "N/A")
+
+            report_view = memory_report.copy()
+            for col in ['bytes_before', 'bytes_after', 'bytes_saved']:
+                report_view[col] = report_view[col].apply(format_bytes)
+            report_view.columns = ['Column', 'Type Before', 'Type After', 'Before', 'After', 'Saved']
+            st.dataframe(report_view, use_container_width=True, hide_index=True)
+
 # Footer
 st.markdown("---")
 st.markdown(